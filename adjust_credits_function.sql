@@ -0,0 +1,30 @@
+-- Atomic credit balance changes: one round-trip per billing operation and no
+-- over-spend when two requests deduct at the same time.
+-- Used by SupabaseManager.deduct_credits / add_credits via service_client.rpc('adjust_credits')
+
+-- ON CONFLICT needs a unique user_id
+CREATE UNIQUE INDEX IF NOT EXISTS idx_user_credits_user_id_unique ON user_credits(user_id);
+
+-- Creates the record with p_initial credits if missing, then applies p_delta.
+-- Returns the new balance as a one-row table (postgrest-py only accepts list responses),
+-- or no rows when the balance would drop below zero.
+CREATE OR REPLACE FUNCTION adjust_credits(p_user_id UUID, p_delta INTEGER, p_initial INTEGER DEFAULT 2)
+RETURNS TABLE (credits INTEGER) AS $$
+#variable_conflict use_column
+BEGIN
+    INSERT INTO user_credits (user_id, credits)
+    VALUES (p_user_id, p_initial)
+    ON CONFLICT (user_id) DO NOTHING;
+
+    RETURN QUERY
+    UPDATE user_credits
+       SET credits = user_credits.credits + p_delta,
+           updated_at = NOW()
+     WHERE user_credits.user_id = p_user_id
+       AND user_credits.credits + p_delta >= 0
+    RETURNING user_credits.credits;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Only the backend (service role) may call it
+REVOKE EXECUTE ON FUNCTION adjust_credits(UUID, INTEGER, INTEGER) FROM PUBLIC, anon, authenticated;
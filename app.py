@@ -4,11 +4,13 @@ import os
 import logging
 import json
 import tempfile
+import uuid
+from pathlib import Path
 import re
 from dotenv import load_dotenv
 from config import config
 from supabase_client import supabase_manager
-from stripe_client import stripe_manager
+from stripe_client import get_stripe_manager
 from nowpayments_client import nowpayments_manager
 from html_preview_generator import HTMLPreviewGenerator
 import openai
@@ -119,6 +121,9 @@ else:
     logger.warning("⚠️  DeepSeek API key not found. DeepSeek model will not work.")
     deepseek_client = None
 
+# Open the NOWPayments connection in the background so the first checkout skips the TLS handshake
+nowpayments_manager.start_warmup()
+
 # Available AI models configuration
 AVAILABLE_MODELS = {
     "gpt-5": {
@@ -300,76 +305,88 @@ def generate_game_thumbnail_with_multiple_attempts(html_content: str, game_title
     """
     wait_times = [2, 4, 6]  # Reduced wait times for faster generation
     
-    for attempt in range(3):
-        try:
-            logger.info(f"Thumbnail generation attempt {attempt + 1}/3 for {game_title}")
-            
-            temp_html_path = None
-            generator = None
-            
+    # Validate HTML content
+    if not html_content or len(html_content.strip()) == 0:
+        logger.error("Empty HTML content provided for thumbnail generation")
+        return None
+    
+    # One generator (one Chrome launch) and one temporary HTML file shared by all attempts
+    generator = None
+    temp_html_path = None
+    
+    try:
+        for attempt in range(3):
             try:
-                # Validate HTML content
-                if not html_content or len(html_content.strip()) == 0:
-                    logger.error("Empty HTML content provided for thumbnail generation")
-                    return None
-                
-                # Create a temporary HTML file
-                with tempfile.NamedTemporaryFile(mode='w', suffix='.html', delete=False, encoding='utf-8') as temp_file:
-                    temp_file.write(html_content)
-                    temp_html_path = temp_file.name
-                
-                logger.info(f"Created temporary HTML file: {temp_html_path}")
+                logger.info(f"Thumbnail generation attempt {attempt + 1}/3 for {game_title}")
                 
-                # Generate thumbnail using HTMLPreviewGenerator
-                generator = HTMLPreviewGenerator(headless=True, window_size=(800, 600))
-                
-                # Generate the thumbnail with current attempt's wait time
-                thumbnail_path = generator.generate_preview(
-                    html_file_path=temp_html_path,
-                    wait_time=wait_times[attempt]
-                )
-                
-                if thumbnail_path and os.path.exists(thumbnail_path):
-                    file_size = os.path.getsize(thumbnail_path)
-                    logger.info(f"Attempt {attempt + 1} thumbnail generated successfully: {thumbnail_path} (size: {file_size} bytes)")
+                try:
+                    # Create the temporary HTML file once
+                    if temp_html_path is None:
+                        with tempfile.NamedTemporaryFile(mode='w', suffix='.html', delete=False, encoding='utf-8') as temp_file:
+                            temp_file.write(html_content)
+                            temp_html_path = temp_file.name
+                        
+                        logger.info(f"Created temporary HTML file: {temp_html_path}")
                     
-                    # Validate thumbnail file
-                    if file_size > 0:
-                        return thumbnail_path
-                    else:
-                        logger.error(f"Attempt {attempt + 1} generated thumbnail file is empty")
-                else:
-                    logger.error(f"Attempt {attempt + 1} failed to generate thumbnail")
+                    # Generate thumbnail using HTMLPreviewGenerator (the driver starts on first use)
+                    if generator is None:
+                        generator = HTMLPreviewGenerator(headless=True, window_size=(800, 600))
                     
-            except Exception as e:
-                logger.error(f"Error in attempt {attempt + 1} for {game_title}: {e}")
-                
-            finally:
-                # Clean up generator
-                if generator:
-                    try:
-                        generator.close()
-                    except Exception as e:
-                        logger.warning(f"Error closing generator in attempt {attempt + 1}: {e}")
-                
-                # Clean up temporary HTML file
-                if temp_html_path and os.path.exists(temp_html_path):
+                    # Generate the thumbnail with current attempt's wait time
+                    thumbnail_path = generator.generate_preview(
+                        html_file_path=temp_html_path,
+                        wait_time=wait_times[attempt]
+                    )
+                    
+                    # One stat call: a missing file counts as not generated
                     try:
-                        os.unlink(temp_html_path)
-                    except Exception as e:
-                        logger.warning(f"Failed to clean up temporary file in attempt {attempt + 1}: {e}")
-            
-            # If this attempt failed and we have more attempts, wait before retrying
-            if attempt < 2:
-                logger.info(f"Waiting 2 seconds before attempt {attempt + 2}...")
-                import time
-                time.sleep(2)
+                        file_size = os.path.getsize(thumbnail_path) if thumbnail_path else None
+                    except OSError:
+                        file_size = None
+                    
+                    if file_size is not None:
+                        logger.info(f"Attempt {attempt + 1} thumbnail generated successfully: {thumbnail_path} (size: {file_size} bytes)")
+                        
+                        # Validate thumbnail file
+                        if file_size > 0:
+                            return thumbnail_path
+                        else:
+                            logger.error(f"Attempt {attempt + 1} generated thumbnail file is empty")
+                    else:
+                        logger.error(f"Attempt {attempt + 1} failed to generate thumbnail")
+                        
+                except Exception as e:
+                    logger.error(f"Error in attempt {attempt + 1} for {game_title}: {e}")
+                    # The browser may have crashed or hung: give the next attempt a fresh one
+                    if generator is not None:
+                        try:
+                            generator.close()
+                        except Exception as close_error:
+                            logger.warning(f"Error closing thumbnail generator: {close_error}")
+                        generator = None
                 
-        except Exception as e:
-            logger.error(f"Unexpected error in attempt {attempt + 1} for {game_title}: {e}")
+                # No pause before the next attempt: it already waits longer on the page (wait_times)
+                    
+            except Exception as e:
+                logger.error(f"Unexpected error in attempt {attempt + 1} for {game_title}: {e}")
+        
+        logger.error(f"All 3 attempts failed for thumbnail generation: {game_title}")
+        return None
     
-    logger.error(f"All 3 attempts failed for thumbnail generation: {game_title}")
-    return None
+    finally:
+        # Clean up generator
+        if generator:
+            try:
+                generator.close()
+            except Exception as e:
+                logger.warning(f"Error closing thumbnail generator: {e}")
+        
+        # Clean up temporary HTML file
+        if temp_html_path:
+            try:
+                Path(temp_html_path).unlink(missing_ok=True)
+            except Exception as e:
+                logger.warning(f"Failed to clean up temporary file: {e}")
 
 # Game generation system instructions
 SYSTEM_INSTRUCTIONS_ONE_CALL = """
@@ -704,11 +721,12 @@ def index():
     try:
         if supabase_manager.is_connected():
             # Get top 3 trending games ordered by likes with nicknames
-            uploaded_games_raw = supabase_manager.get_games_with_nicknames(limit=3, order_by='likes_count')
-            
-            # Get user's liked games if authenticated
             if 'user_id' in session:
-                user_liked_games = supabase_manager.get_user_liked_games(str(session['user_id']))
+                # Games, nicknames and the user's likes in one call
+                uploaded_games_raw = supabase_manager.list_games_for_user(str(session['user_id']), limit=3, order_by='likes_count')
+                user_liked_games = {game['id'] for game in uploaded_games_raw if game.get('liked')}
+            else:
+                uploaded_games_raw = supabase_manager.get_games_with_nicknames(limit=3, order_by='likes_count')
             
             # Transform games for homepage
             for game in uploaded_games_raw:
@@ -1216,14 +1234,22 @@ def games():
         if supabase_manager.is_connected():
             # Get games with statistics and nicknames ordered by selected sort option
             if search_query:
+                # Get user's liked games if authenticated (runs concurrently with the search query)
+                liked_future = None
+                if 'user_id' in session:
+                    liked_future = supabase_manager.submit(supabase_manager.get_user_liked_games, str(session['user_id']))
+                
                 uploaded_games_raw = supabase_manager.search_games_with_stats(search_query, order_by=sort_by)
+                
+                if liked_future is not None:
+                    user_liked_games = liked_future.result()
+            elif 'user_id' in session:
+                # Games, nicknames and the user's likes in one call
+                uploaded_games_raw = supabase_manager.list_games_for_user(str(session['user_id']), order_by=sort_by)
+                user_liked_games = {game['id'] for game in uploaded_games_raw if game.get('liked')}
             else:
                 uploaded_games_raw = supabase_manager.get_games_with_nicknames(order_by=sort_by)
             
-            # Get user's liked games if authenticated
-            if 'user_id' in session:
-                user_liked_games = supabase_manager.get_user_liked_games(str(session['user_id']))
-            
             # Transform uploaded games to match template format
             for game in uploaded_games_raw:
                 # Use actual user-provided title, fallback to filename if not available
@@ -1548,7 +1574,7 @@ def payment():
         logger.info("User accessing payment page without session - showing packages anyway")
         # Продолжаем выполнение вместо redirect на login
     
-    if not stripe_manager.is_configured():
+    if not get_stripe_manager().is_configured():
         flash('Stripe not configured. Payment feature will be available after setup', 'warning')
         return redirect(url_for('index'))  # Redirect to index instead of my_games
     
@@ -1622,7 +1648,7 @@ def payment():
                          authenticated=authenticated, 
                          user_credits=user_credits,
                          credit_packages=credit_packages,
-                         stripe_publishable_key=stripe_manager.publishable_key)
+                         stripe_publishable_key=get_stripe_manager().publishable_key)
 
 @app.route('/create_payment_intent', methods=['POST'])
 def create_payment_intent():
@@ -1630,6 +1656,7 @@ def create_payment_intent():
     if 'user_id' not in session:
         return jsonify({'error': 'Authentication required'}), 401
     
+    stripe_manager = get_stripe_manager()
     if not stripe_manager.is_configured():
         return jsonify({'error': 'Stripe not configured'}), 400
     
@@ -1678,15 +1705,13 @@ def stripe_webhook():
     logger.info(f"Webhook received: {request.method} {request.url}")
     logger.info(f"Headers: {dict(request.headers)}")
     
-    if not stripe_manager.verify_webhook_signature(payload, sig_header):
+    if not get_stripe_manager().verify_webhook_signature(payload, sig_header):
         logger.error("Webhook signature verification failed - rejecting request")
         logger.error("Check STRIPE_WEBHOOK_SECRET environment variable")
         return jsonify({'error': 'Invalid signature'}), 400
     
     try:
-        event = stripe.Event.construct_from(
-            json.loads(payload), stripe.api_key
-        )
+        event = get_stripe_manager().parse_event(payload)
         
         # Handle successful payment (Payment Links use checkout.session.completed)
         if event.type == 'checkout.session.completed':
@@ -1802,6 +1827,15 @@ def stripe_webhook():
             else:
                 logger.error("No line items found in checkout session")
         
+        elif event.type in ('customer.updated', 'customer.deleted'):
+            # Keep the email -> customer id cache in sync with Stripe
+            customer = event.data.object
+            previous = event.data.get('previous_attributes') or {}
+            stripe_manager = get_stripe_manager()
+            stripe_manager.invalidate_customer_email(customer.get('email'))
+            stripe_manager.invalidate_customer_email(previous.get('email'))
+            stripe_manager.invalidate_customer(customer.get('id'))
+        
         return jsonify({'status': 'success'})
         
     except Exception as e:
@@ -1824,14 +1858,15 @@ def payment_success():
     if session_id and 'user_id' in session:
         try:
             # Get the checkout session from Stripe
-            checkout_session = stripe.checkout.Session.retrieve(session_id)
+            stripe_manager = get_stripe_manager()
+            checkout_session = stripe_manager.get_checkout_session(session_id)
             
-            if checkout_session.payment_status == 'paid':
+            if checkout_session and checkout_session.payment_status == 'paid':
                 logger.info(f"Processing backup credit addition for session {session_id}")
                 
                 # Get line items to determine credits
-                line_items = stripe.checkout.Session.list_line_items(session_id)
-                if line_items.data:
+                line_items = stripe_manager.list_checkout_line_items(session_id)
+                if line_items and line_items.data:
                     product_name = line_items.data[0].description
                     logger.info(f"Backup: Processing payment for product: '{product_name}'")
                     
@@ -1927,7 +1962,6 @@ def nowpayments_create():
             return jsonify({'error': 'Missing required parameters'}), 400
         
         # Generate unique order ID
-        import uuid
         order_id = f"credits_{credits}_{uuid.uuid4().hex[:8]}"
         
         # Store user_id in order_id if logged in
@@ -0,0 +1,24 @@
+-- Games joined with their statistics so ORDER BY likes/plays and LIMIT run in Postgres
+-- Used by SupabaseManager.get_games_with_stats / search_games_with_stats / get_games_with_nicknames
+CREATE OR REPLACE VIEW games_with_stats
+WITH (security_invoker = true) AS
+SELECT
+    ud.id,
+    ud.user_id,
+    ud.data_type,
+    ud.filename,
+    ud.title,
+    ud.description,
+    ud.thumbnail_url,
+    ud.created_at,
+    ud.updated_at,
+    COALESCE(gs.likes_count, 0) AS likes_count,
+    COALESCE(gs.plays_count, 0) AS plays_count,
+    un.nickname AS user_nickname
+FROM user_data ud
+LEFT JOIN game_statistics gs ON gs.game_id = ud.id
+LEFT JOIN user_nicknames un ON un.user_id = ud.user_id
+WHERE ud.data_type = 'html_game';
+
+-- Join lookup from user_data to its statistics row
+CREATE INDEX IF NOT EXISTS idx_game_statistics_game_id ON game_statistics(game_id);
@@ -0,0 +1,17 @@
+-- Indexed lookup of one auth user by email (auth.users is not exposed through PostgREST)
+-- Used by SupabaseManager.get_user_by_email via service_client.rpc('get_user_by_email')
+CREATE OR REPLACE FUNCTION get_user_by_email(p_email TEXT)
+-- Returns a zero- or one-row table: postgrest-py only accepts list responses from rpc()
+RETURNS TABLE (
+    id auth.users.id%TYPE,
+    email auth.users.email%TYPE,
+    created_at auth.users.created_at%TYPE
+) AS $$
+    SELECT u.id, u.email, u.created_at
+    FROM auth.users u
+    WHERE u.email = p_email
+    LIMIT 1;
+$$ LANGUAGE sql STABLE SECURITY DEFINER SET search_path = '';
+
+-- Only the backend (service role) may call it: it reveals whether an account exists
+REVOKE EXECUTE ON FUNCTION get_user_by_email(TEXT) FROM PUBLIC, anon, authenticated;
@@ -13,6 +13,7 @@ Example:
 """
 
 import os
+import re
 import sys
 import time
 import argparse
@@ -31,8 +32,37 @@ from PIL import Image, ImageDraw, ImageFont
 import io
 import base64
 
+# Screenshots are stored as JPEG by default: several times smaller than PNG to upload and serve
+JPEG_QUALITY = 85
+JPEG_SUFFIXES = ('.jpg', '.jpeg')
+
+# <title> of the game page, used as the caption of the fallback thumbnail
+TITLE_RE = re.compile(r'<title[^>]*>([^<]+)</title>', re.IGNORECASE)
+
+# Chrome flags shared by every driver setup; the background ones switch off subsystems a one-page screenshot never uses
+CHROME_ARGUMENTS = (
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-logging",
+    "--disable-web-security",
+    "--allow-running-insecure-content",
+    "--disable-background-networking",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--no-first-run",
+    "--mute-audio",
+    "--hide-scrollbars",
+)
+
 
 class HTMLPreviewGenerator:
+    # When every driver method failed (e.g. no Chrome installed), later generators in this
+    # process go straight to the PIL fallback for DRIVER_RETRY_INTERVAL seconds
+    DRIVER_RETRY_INTERVAL = 600
+    _driver_failed_at = None
+    
     def __init__(self, headless=True, window_size=(1920, 1080)):
         """
         Initialize the HTML Preview Generator.
@@ -113,23 +143,31 @@ class HTMLPreviewGenerator:
             # Draw a border
             draw.rectangle([10, 10, width-10, height-10], outline='#00ff00', width=2)
             
-            # Save the image
-            img.save(output_path, 'PNG')
+            # Save the image (format from the extension: JPEG for .jpg/.jpeg, PNG otherwise)
+            if Path(output_path).suffix.lower() in JPEG_SUFFIXES:
+                img.save(output_path, 'JPEG', quality=JPEG_QUALITY)
+            else:
+                img.save(output_path, 'PNG')
             
-            if os.path.exists(output_path):
+            try:
                 file_size = os.path.getsize(output_path)
-                self.logger.info(f"Fallback thumbnail created: {output_path} (size: {file_size} bytes)")
-                return str(output_path)
-            else:
+            except OSError:
                 self.logger.error("Failed to create fallback thumbnail")
                 return None
+            self.logger.info("Fallback thumbnail created: %s (size: %s bytes)", output_path, file_size)
+            return str(output_path)
                 
         except Exception as e:
-            self.logger.error(f"Error creating fallback thumbnail: {e}")
+            self.logger.error("Error creating fallback thumbnail: %s", e)
             return None
         
     def setup_driver(self):
         """Setup Chrome WebDriver with appropriate options."""
+        failed_at = HTMLPreviewGenerator._driver_failed_at
+        if failed_at is not None and time.monotonic() - failed_at < self.DRIVER_RETRY_INTERVAL:
+            self.logger.info("Chrome driver failed recently, skipping straight to fallback method")
+            return False
+        
         # Try multiple methods to initialize Chrome driver
         methods = []
         
@@ -143,15 +181,17 @@ class HTMLPreviewGenerator:
         
         for method_name, method_func in methods:
             try:
-                self.logger.info(f"Trying {method_name}...")
+                self.logger.info("Trying %s...", method_name)
                 if method_func():
-                    self.logger.info(f"✓ {method_name} initialized successfully")
+                    self.logger.info("✓ %s initialized successfully", method_name)
+                    HTMLPreviewGenerator._driver_failed_at = None
                     return True
             except Exception as e:
-                self.logger.warning(f"✗ {method_name} failed: {e}")
+                self.logger.warning("✗ %s failed: %s", method_name, e)
                 continue
         
         self.logger.error("All Chrome driver methods failed, will use fallback method")
+        HTMLPreviewGenerator._driver_failed_at = time.monotonic()
         return False
     
     def _setup_undetected_chrome(self):
@@ -159,13 +199,8 @@ class HTMLPreviewGenerator:
         options = uc.ChromeOptions()
         if self.headless:
             options.add_argument("--headless")
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
-        options.add_argument("--disable-gpu")
-        options.add_argument("--disable-extensions")
-        options.add_argument("--disable-logging")
-        options.add_argument("--disable-web-security")
-        options.add_argument("--allow-running-insecure-content")
+        for argument in CHROME_ARGUMENTS:
+            options.add_argument(argument)
         options.add_argument("--disable-blink-features=AutomationControlled")
         options.add_argument(f"--window-size={self.window_size[0]},{self.window_size[1]}")
         
@@ -181,13 +216,8 @@ class HTMLPreviewGenerator:
             chrome_options.add_argument("--headless")
         
         # Additional options for better rendering
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--disable-extensions")
-        chrome_options.add_argument("--disable-logging")
-        chrome_options.add_argument("--disable-web-security")
-        chrome_options.add_argument("--allow-running-insecure-content")
+        for argument in CHROME_ARGUMENTS:
+            chrome_options.add_argument(argument)
         chrome_options.add_argument(f"--window-size={self.window_size[0]},{self.window_size[1]}")
         
         # Set user agent
@@ -209,7 +239,7 @@ class HTMLPreviewGenerator:
         
         if chrome_binary:
             chrome_options.binary_location = chrome_binary
-            self.logger.info(f"Using Chrome binary: {chrome_binary}")
+            self.logger.info("Using Chrome binary: %s", chrome_binary)
         
         # Try to find ChromeDriver
         chromedriver_paths = [
@@ -241,13 +271,8 @@ class HTMLPreviewGenerator:
         if self.headless:
             chrome_options.add_argument("--headless")
         
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--disable-extensions")
-        chrome_options.add_argument("--disable-logging")
-        chrome_options.add_argument("--disable-web-security")
-        chrome_options.add_argument("--allow-running-insecure-content")
+        for argument in CHROME_ARGUMENTS:
+            chrome_options.add_argument(argument)
         chrome_options.add_argument(f"--window-size={self.window_size[0]},{self.window_size[1]}")
         
         # Initialize the driver with automatic ChromeDriver management
@@ -263,19 +288,19 @@ class HTMLPreviewGenerator:
         Args:
             html_file_path (str): Path to the HTML file
             output_path (str, optional): Output path for the screenshot
-            wait_time (int): Time to wait for page to load (seconds)
+            wait_time (int): Time to let the page load and render before the screenshot (seconds)
             
         Returns:
             str: Path to the generated screenshot, or None if failed
         """
         if not os.path.exists(html_file_path):
-            self.logger.error(f"HTML file not found: {html_file_path}")
+            self.logger.error("HTML file not found: %s", html_file_path)
             return None
         
         # Generate output path if not provided
         if not output_path:
             html_file = Path(html_file_path)
-            output_path = html_file.parent / f"{html_file.stem}_preview.png"
+            output_path = html_file.parent / f"{html_file.stem}_preview.jpg"
         
         # Try to setup driver, if it fails, use fallback
         if not self.driver:
@@ -287,13 +312,12 @@ class HTMLPreviewGenerator:
                         html_content = f.read()
                     
                     # Extract title from HTML
-                    import re
-                    title_match = re.search(r'<title[^>]*>([^<]+)</title>', html_content, re.IGNORECASE)
+                    title_match = TITLE_RE.search(html_content)
                     title = title_match.group(1).strip() if title_match else "Game Preview"
                     
                     return self._create_fallback_thumbnail(html_content, output_path, title)
                 except Exception as e:
-                    self.logger.error(f"Fallback thumbnail generation failed: {e}")
+                    self.logger.error("Fallback thumbnail generation failed: %s", e)
                     return None
         
         try:
@@ -301,15 +325,24 @@ class HTMLPreviewGenerator:
             html_file_path = os.path.abspath(html_file_path)
             file_url = f"file://{html_file_path}"
             
-            self.logger.info(f"Loading HTML file: {html_file_path}")
-            self.logger.info(f"File URL: {file_url}")
+            self.logger.info("Loading HTML file: %s", html_file_path)
+            self.logger.info("File URL: %s", file_url)
             
             # Load the HTML file
+            load_started = time.monotonic()
             self.driver.get(file_url)
             
-            # Wait for page to load
-            self.logger.info(f"Waiting {wait_time} seconds for page to load...")
-            time.sleep(wait_time)
+            # Wait for page to load, then let timer/rAF-driven games render for the rest of wait_time
+            self.logger.info("Waiting %s seconds for page to load...", wait_time)
+            try:
+                WebDriverWait(self.driver, wait_time).until(
+                    lambda driver: driver.execute_script("return document.readyState") == "complete"
+                )
+            except TimeoutException:
+                self.logger.info("Page still loading after %s seconds, proceeding", wait_time)
+            settle_time = wait_time - (time.monotonic() - load_started)
+            if settle_time > 0:
+                time.sleep(settle_time)
             
             # Try to wait for canvas or other dynamic content to render
             try:
@@ -324,30 +357,49 @@ class HTMLPreviewGenerator:
             
             # Take screenshot
             self.logger.info("Taking screenshot...")
-            self.driver.save_screenshot(str(output_path))
+            self._save_screenshot(output_path)
             
-            # Verify screenshot was created and has content
-            if os.path.exists(output_path):
+            # Verify screenshot was created and has content (one stat call)
+            try:
                 file_size = os.path.getsize(output_path)
-                if file_size > 0:
-                    self.logger.info(f"Screenshot saved: {output_path} (size: {file_size} bytes)")
-                    return str(output_path)
-                else:
-                    self.logger.error(f"Screenshot file is empty: {output_path}")
-                    return None
+            except OSError:
+                self.logger.error("Screenshot file was not created: %s", output_path)
+                return None
+            if file_size > 0:
+                self.logger.info("Screenshot saved: %s (size: %s bytes)", output_path, file_size)
+                return str(output_path)
             else:
-                self.logger.error(f"Screenshot file was not created: {output_path}")
+                self.logger.error("Screenshot file is empty: %s", output_path)
                 return None
             
         except WebDriverException as e:
-            self.logger.error(f"WebDriver error: {e}")
+            self.logger.error("WebDriver error: %s", e)
+            # The browser may have crashed or hung: drop it so the next call starts a fresh one
+            self._discard_driver()
             # Try fallback method
             return self._try_fallback_generation(html_file_path, output_path)
         except Exception as e:
-            self.logger.error(f"Unexpected error: {e}")
+            self.logger.error("Unexpected error: %s", e)
             # Try fallback method
             return self._try_fallback_generation(html_file_path, output_path)
     
+    def _save_screenshot(self, output_path):
+        """
+        Save the current page as PNG or JPEG, depending on the output extension.
+        
+        Chrome only returns PNG, so JPEG output is re-encoded in memory with Pillow.
+        
+        Args:
+            output_path: Path where to save the screenshot
+        """
+        if Path(output_path).suffix.lower() not in JPEG_SUFFIXES:
+            self.driver.save_screenshot(str(output_path))
+            return
+        
+        png_bytes = self.driver.get_screenshot_as_png()
+        with Image.open(io.BytesIO(png_bytes)) as img:
+            img.convert('RGB').save(output_path, 'JPEG', quality=JPEG_QUALITY)
+    
     def _try_fallback_generation(self, html_file_path, output_path):
         """Try to generate thumbnail using fallback method"""
         try:
@@ -356,15 +408,23 @@ class HTMLPreviewGenerator:
                 html_content = f.read()
             
             # Extract title from HTML
-            import re
-            title_match = re.search(r'<title[^>]*>([^<]+)</title>', html_content, re.IGNORECASE)
+            title_match = TITLE_RE.search(html_content)
             title = title_match.group(1).strip() if title_match else "Game Preview"
             
             return self._create_fallback_thumbnail(html_content, output_path, title)
         except Exception as e:
-            self.logger.error(f"Fallback generation also failed: {e}")
+            self.logger.error("Fallback generation also failed: %s", e)
             return None
     
+    def _discard_driver(self):
+        """Quit a possibly dead WebDriver and forget it (setup_driver runs again on next use)."""
+        driver, self.driver = self.driver, None
+        if driver:
+            try:
+                driver.quit()
+            except Exception as e:
+                self.logger.warning("Error quitting WebDriver: %s", e)
+    
     def close(self):
         """Close the WebDriver."""
         if self.driver:
@@ -380,7 +440,7 @@ def main():
         epilog="""
 Examples:
   python html_preview_generator.py game.html
-  python html_preview_generator.py game.html preview.png
+  python html_preview_generator.py game.html preview.jpg
   python html_preview_generator.py /path/to/game.html /path/to/output.png
         """
     )
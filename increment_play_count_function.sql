@@ -0,0 +1,19 @@
+-- Atomic play counter: one round-trip per play and no lost updates under concurrency
+-- Used by SupabaseManager.increment_game_play_count via service_client.rpc('increment_play_count')
+
+-- ON CONFLICT needs a unique game_id
+CREATE UNIQUE INDEX IF NOT EXISTS idx_game_statistics_game_id_unique ON game_statistics(game_id);
+
+CREATE OR REPLACE FUNCTION increment_play_count(p_game_id game_statistics.game_id%TYPE)
+-- Returns a one-row table: postgrest-py only accepts list responses from rpc()
+RETURNS TABLE (plays_count INTEGER) AS $$
+    INSERT INTO game_statistics (game_id, likes_count, plays_count)
+    VALUES (p_game_id, 0, 1)
+    ON CONFLICT (game_id) DO UPDATE
+        SET plays_count = game_statistics.plays_count + 1,
+            updated_at = NOW()
+    RETURNING plays_count;
+$$ LANGUAGE sql SECURITY DEFINER;
+
+-- Only the backend (service role) may call it
+REVOKE EXECUTE ON FUNCTION increment_play_count(game_statistics.game_id%TYPE) FROM PUBLIC, anon, authenticated;
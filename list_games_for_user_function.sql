@@ -0,0 +1,52 @@
+-- Games list for a logged-in user in one round-trip: statistics, author nickname and a liked flag
+-- Used by SupabaseManager.list_games_for_user via service_client.rpc('list_games_for_user')
+-- Requires games_with_stats_view.sql and trending_games_view.sql
+-- likes_count comes from trending_games (game_likes rows), the same source as the anonymous trending list
+CREATE OR REPLACE FUNCTION list_games_for_user(
+    p_user_id game_likes.user_id%TYPE,
+    p_order_by TEXT DEFAULT 'created_at',
+    p_limit INTEGER DEFAULT NULL
+)
+RETURNS TABLE (
+    id user_data.id%TYPE,
+    user_id user_data.user_id%TYPE,
+    data_type user_data.data_type%TYPE,
+    filename user_data.filename%TYPE,
+    title user_data.title%TYPE,
+    description user_data.description%TYPE,
+    thumbnail_url user_data.thumbnail_url%TYPE,
+    created_at user_data.created_at%TYPE,
+    updated_at user_data.updated_at%TYPE,
+    likes_count trending_games.likes_count%TYPE,
+    plays_count games_with_stats.plays_count%TYPE,
+    user_nickname games_with_stats.user_nickname%TYPE,
+    liked BOOLEAN
+) AS $$
+    SELECT
+        gws.id,
+        gws.user_id,
+        gws.data_type,
+        gws.filename,
+        gws.title,
+        gws.description,
+        gws.thumbnail_url,
+        gws.created_at,
+        gws.updated_at,
+        tg.likes_count,
+        gws.plays_count,
+        gws.user_nickname,
+        gl.user_id IS NOT NULL
+    FROM games_with_stats gws
+    JOIN trending_games tg ON tg.id = gws.id
+    LEFT JOIN game_likes gl ON gl.game_id = gws.id AND gl.user_id = p_user_id
+    ORDER BY
+        CASE p_order_by
+            WHEN 'likes_count' THEN tg.likes_count
+            WHEN 'plays_count' THEN gws.plays_count
+        END DESC NULLS LAST,
+        gws.created_at DESC
+    LIMIT p_limit;
+$$ LANGUAGE sql STABLE SECURITY DEFINER;
+
+-- Only the backend (service role) may call it: p_user_id is trusted input
+REVOKE EXECUTE ON FUNCTION list_games_for_user(game_likes.user_id%TYPE, TEXT, INTEGER) FROM PUBLIC, anon, authenticated;
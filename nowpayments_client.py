@@ -3,44 +3,156 @@ NOWPayments API Integration Module
 Handles cryptocurrency payment processing via NOWPayments
 """
 import os
+import asyncio
 import logging
 import requests
+import aiohttp
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import orjson
 import hmac
 import hashlib
+import threading
+from cachetools import TTLCache
 from typing import Optional, Dict, Any, List
 
 logger = logging.getLogger(__name__)
 
-class NOWPaymentsManager:
-    """Class for managing NOWPayments API integration"""
+# orjson is considerably faster than stdlib json used by requests
+_dumps = orjson.dumps
+_loads = orjson.loads
+
+class _NOWPaymentsConfig:
+    """
+    Settings shared by the sync and async NOWPayments managers
+    
+    Holds the environment configuration, request headers and the reference
+    data caches; transport (requests / aiohttp) lives in the subclasses.
+    """
     
     # NOWPayments API Base URLs
     PRODUCTION_URL = "https://api.nowpayments.io/v1"
     SANDBOX_URL = "https://api-sandbox.nowpayments.io/v1"
     
+    # Slow-changing reference data is cached per process and shared by both
+    # managers; estimates (price-like) are not cached
+    _currencies_cache = TTLCache(maxsize=1, ttl=3600)
+    _min_amount_cache = TTLCache(maxsize=512, ttl=900)
+    _cache_lock = threading.Lock()
+    
     def __init__(self):
         self.api_key = os.getenv('NOWPAYMENTS_API_KEY')
         self.ipn_secret = os.getenv('NOWPAYMENTS_IPN_SECRET')
         self.use_sandbox = os.getenv('NOWPAYMENTS_SANDBOX', 'false').lower() == 'true'
+        self._configured = bool(self.api_key)
+        self._lc_cache: Dict[str, str] = {}
         
         # Set base URL based on environment
         self.base_url = self.SANDBOX_URL if self.use_sandbox else self.PRODUCTION_URL
         
-        if self.api_key:
-            logger.info(f"NOWPayments API configured ({'sandbox' if self.use_sandbox else 'production'} mode)")
-        else:
-            logger.warning("NOWPayments API key not configured")
+        # Headers are static per process: build them once
+        self._headers = {
+            'x-api-key': self.api_key or '',
+            'Content-Type': 'application/json'
+        }
+    
+    def _lc(self, code: str) -> str:
+        """
+        Lowercase a currency code, memoized (codes come from a small closed set)
+        
+        Args:
+            code: Currency code (e.g., 'USD')
+            
+        Returns:
+            Lowercased currency code
+        """
+        value = self._lc_cache.get(code)
+        if value is None:
+            value = code.lower()
+            if len(self._lc_cache) < 1024:
+                self._lc_cache[code] = value
+        return value
     
     def is_configured(self) -> bool:
         """Check if NOWPayments is properly configured"""
-        return bool(self.api_key)
+        return self._configured
     
     def _get_headers(self) -> Dict[str, str]:
         """Get headers for API requests"""
-        return {
-            'x-api-key': self.api_key,
-            'Content-Type': 'application/json'
-        }
+        return self._headers
+    
+    def _cache_get(self, cache: TTLCache, key: Any) -> Optional[Any]:
+        """Read a reference data cache entry (None if missing or expired)"""
+        with self._cache_lock:
+            return cache.get(key)
+    
+    def _cache_set(self, cache: TTLCache, key: Any, value: Any) -> None:
+        """Store a reference data cache entry"""
+        with self._cache_lock:
+            cache[key] = value
+
+
+class NOWPaymentsManager(_NOWPaymentsConfig):
+    """Class for managing NOWPayments API integration"""
+    
+    def __init__(self):
+        super().__init__()
+        self._ipn_secret_bytes = self.ipn_secret.encode('utf-8') if self.ipn_secret else b''
+        # Keyed HMAC template: .copy() per message skips re-running key setup
+        self._hmac_template = hmac.new(self._ipn_secret_bytes, b'', hashlib.sha512)
+        
+        # Persistent session keeps the pooled keep-alive connection
+        self.session = requests.Session()
+        self.session.headers.update(self._headers)
+        self.session.mount('https://', HTTPAdapter(max_retries=self._build_retry()))
+        self._warmup_started = False
+        
+        if self.api_key:
+            logger.info(f"NOWPayments API configured ({'sandbox' if self.use_sandbox else 'production'} mode)")
+        else:
+            logger.warning("NOWPayments API key not configured")
+    
+    @staticmethod
+    def _build_retry() -> Retry:
+        """
+        Transport-level retry policy for the persistent session
+        
+        Retries stay on the pooled keep-alive connection. Status/read retries
+        are limited to idempotent methods: re-sending POST /payment or
+        POST /invoice could create duplicate orders. Connection errors
+        (request never sent) are retried for every method.
+        """
+        return Retry(
+            total=3,
+            connect=3,
+            read=3,
+            status=3,
+            backoff_factor=0.3,
+            backoff_jitter=0.2,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+    
+    def start_warmup(self) -> None:
+        """
+        Open the API connection in a background thread (call once from app startup)
+        
+        Moves DNS/TCP/TLS handshake off the first checkout request. Repeated
+        calls and unconfigured managers are no-ops.
+        """
+        if not self._configured or self._warmup_started:
+            return
+        self._warmup_started = True
+        threading.Thread(target=self._warmup_connection, daemon=True).start()
+    
+    def _warmup_connection(self) -> None:
+        """Open a pooled keep-alive connection to the API in the background"""
+        try:
+            self.session.head(f"{self.base_url}/status", timeout=5)
+        except requests.exceptions.RequestException as e:
+            logger.debug(f"NOWPayments warmup failed (will connect on first request): {e}")
     
     def get_available_currencies(self) -> Optional[List[str]]:
         """
@@ -49,21 +161,25 @@ class NOWPaymentsManager:
         Returns:
             List of currency codes or None on error
         """
-        if not self.is_configured():
+        if not self._configured:
             logger.error("NOWPayments not configured")
             return None
         
+        cached = self._cache_get(self._currencies_cache, 'all')
+        if cached is not None:
+            return list(cached)
+        
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}/currencies",
-                headers=self._get_headers(),
                 timeout=10
             )
             
             if response.status_code == 200:
-                data = response.json()
+                data = _loads(response.content)
                 currencies = data.get('currencies', [])
                 logger.info(f"Retrieved {len(currencies)} available currencies")
+                self._cache_set(self._currencies_cache, 'all', tuple(currencies))
                 return currencies
             else:
                 logger.error(f"Failed to get currencies: {response.status_code} - {response.text}")
@@ -87,13 +203,17 @@ class NOWPaymentsManager:
         Returns:
             Minimum amount or None on error
         """
-        if not self.is_configured():
+        if not self._configured:
             return None
         
+        cache_key = (self._lc(currency_from), self._lc(currency_to))
+        cached = self._cache_get(self._min_amount_cache, cache_key)
+        if cached is not None:
+            return cached
+        
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}/min-amount",
-                headers=self._get_headers(),
                 params={
                     'currency_from': currency_from,
                     'currency_to': currency_to
@@ -102,8 +222,10 @@ class NOWPaymentsManager:
             )
             
             if response.status_code == 200:
-                data = response.json()
-                return float(data.get('min_amount', 0))
+                data = _loads(response.content)
+                min_amount = float(data.get('min_amount', 0))
+                self._cache_set(self._min_amount_cache, cache_key, min_amount)
+                return min_amount
             else:
                 logger.error(f"Failed to get minimum amount: {response.status_code}")
                 return None
@@ -137,15 +259,15 @@ class NOWPaymentsManager:
         Returns:
             Dictionary with payment data or None on error
         """
-        if not self.is_configured():
+        if not self._configured:
             logger.error("NOWPayments not configured")
             return None
         
         try:
             payload = {
                 'price_amount': price_amount,
-                'price_currency': price_currency.lower(),
-                'pay_currency': pay_currency.lower(),
+                'price_currency': self._lc(price_currency),
+                'pay_currency': self._lc(pay_currency),
                 'order_id': order_id,
                 'order_description': order_description,
                 'ipn_callback_url': ipn_callback_url
@@ -157,15 +279,14 @@ class NOWPaymentsManager:
             if cancel_url:
                 payload['cancel_url'] = cancel_url
             
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/payment",
-                headers=self._get_headers(),
-                json=payload,
+                data=_dumps(payload),
                 timeout=10
             )
             
             if response.status_code == 201 or response.status_code == 200:
-                payment_data = response.json()
+                payment_data = _loads(response.content)
                 logger.info(f"Payment created: {payment_data.get('payment_id')} for order {order_id}")
                 return payment_data
             else:
@@ -202,14 +323,14 @@ class NOWPaymentsManager:
         Returns:
             Dictionary with invoice data or None on error
         """
-        if not self.is_configured():
+        if not self._configured:
             logger.error("NOWPayments not configured")
             return None
         
         try:
             payload = {
                 'price_amount': price_amount,
-                'price_currency': price_currency.lower(),
+                'price_currency': self._lc(price_currency),
                 'order_id': order_id,
                 'order_description': order_description,
                 'ipn_callback_url': ipn_callback_url
@@ -221,15 +342,14 @@ class NOWPaymentsManager:
             if cancel_url:
                 payload['cancel_url'] = cancel_url
             
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/invoice",
-                headers=self._get_headers(),
-                json=payload,
+                data=_dumps(payload),
                 timeout=10
             )
             
             if response.status_code == 201 or response.status_code == 200:
-                invoice_data = response.json()
+                invoice_data = _loads(response.content)
                 logger.info(f"Invoice created: {invoice_data.get('id')} for order {order_id}")
                 return invoice_data
             else:
@@ -253,18 +373,17 @@ class NOWPaymentsManager:
         Returns:
             Dictionary with payment status or None on error
         """
-        if not self.is_configured():
+        if not self._configured:
             return None
         
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}/payment/{payment_id}",
-                headers=self._get_headers(),
                 timeout=10
             )
             
             if response.status_code == 200:
-                return response.json()
+                return _loads(response.content)
             else:
                 logger.error(f"Failed to get payment status: {response.status_code}")
                 return None
@@ -294,15 +413,18 @@ class NOWPaymentsManager:
             return False
         
         try:
-            # Calculate expected signature
-            expected_signature = hmac.new(
-                self.ipn_secret.encode('utf-8'),
-                request_data,
-                hashlib.sha512
-            ).hexdigest()
+            # Compare raw digest bytes instead of hex strings
+            mac = self._hmac_template.copy()
+            mac.update(request_data)
+            expected_signature = mac.digest()
+            
+            try:
+                provided_signature = bytes.fromhex(signature)
+            except ValueError:
+                logger.error("IPN signature is not a valid hex string")
+                return False
             
-            # Compare signatures
-            if hmac.compare_digest(expected_signature, signature):
+            if hmac.compare_digest(expected_signature, provided_signature):
                 logger.info("IPN signature verified successfully")
                 return True
             else:
@@ -313,6 +435,36 @@ class NOWPaymentsManager:
             logger.error(f"Error verifying IPN signature: {e}")
             return False
     
+    def verify_ipn_signatures_batch(self, items: List[tuple]) -> List[bool]:
+        """
+        Verify a batch of IPN callbacks (e.g. webhook replays or reconciliation)
+        
+        Args:
+            items: List of (request_data, signature) pairs
+            
+        Returns:
+            List of booleans in the same order as items
+        """
+        if not self.ipn_secret:
+            logger.error("IPN secret not configured - IPN verification disabled")
+            return [False] * len(items)
+        
+        results = []
+        template = self._hmac_template
+        for request_data, signature in items:
+            mac = template.copy()
+            mac.update(request_data)
+            try:
+                ok = bool(signature) and hmac.compare_digest(mac.digest(), bytes.fromhex(signature))
+            except ValueError:
+                ok = False
+            results.append(ok)
+        
+        failed = results.count(False)
+        if failed:
+            logger.error(f"IPN batch verification: {failed} of {len(results)} signatures invalid")
+        return results
+    
     def get_estimate_price(self, amount: float, currency_from: str, currency_to: str) -> Optional[Dict[str, Any]]:
         """
         Get estimated price for conversion
@@ -325,23 +477,22 @@ class NOWPaymentsManager:
         Returns:
             Dictionary with estimated price or None on error
         """
-        if not self.is_configured():
+        if not self._configured:
             return None
         
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}/estimate",
-                headers=self._get_headers(),
                 params={
                     'amount': amount,
-                    'currency_from': currency_from.lower(),
-                    'currency_to': currency_to.lower()
+                    'currency_from': self._lc(currency_from),
+                    'currency_to': self._lc(currency_to)
                 },
                 timeout=10
             )
             
             if response.status_code == 200:
-                return response.json()
+                return _loads(response.content)
             else:
                 logger.error(f"Failed to get estimate: {response.status_code}")
                 return None
@@ -350,6 +501,129 @@ class NOWPaymentsManager:
             logger.error(f"Error getting estimate: {e}")
             return None
 
+
+class AsyncNOWPaymentsManager(_NOWPaymentsConfig):
+    """
+    Async NOWPayments client on top of aiohttp.
+
+    Read-only endpoints (currencies, min-amount, estimate, payment status)
+    can be awaited concurrently via asyncio.gather, so pricing several coins
+    costs ~1 round trip instead of N. Currencies and minimum amounts share
+    the TTL caches of NOWPaymentsManager. Use as
+    `async with AsyncNOWPaymentsManager() as np:` or call `await close()` when done.
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self._session: Optional[aiohttp.ClientSession] = None
+    
+    async def __aenter__(self) -> 'AsyncNOWPaymentsManager':
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Lazily create the shared aiohttp session (must be called inside a running loop)"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=32, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=10),
+                headers=self._get_headers()
+            )
+        return self._session
+    
+    async def close(self) -> None:
+        """Close the underlying aiohttp session"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+    
+    async def _request(self, method: str, path: str, **kwargs) -> Optional[Any]:
+        """
+        Perform an API request and return decoded JSON
+        
+        Args:
+            method: HTTP method
+            path: API path relative to base_url (e.g., '/currencies')
+            **kwargs: Extra arguments for aiohttp request (params, json)
+            
+        Returns:
+            Decoded JSON or None on error
+        """
+        if not self._configured:
+            return None
+        
+        try:
+            async with self._get_session().request(method, f"{self.base_url}{path}", **kwargs) as response:
+                if response.status in (200, 201):
+                    return _loads(await response.read())
+                logger.error(f"NOWPayments {method} {path} failed: {response.status}")
+                return None
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Error requesting NOWPayments {path}: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"Unexpected error requesting NOWPayments {path}: {e}")
+            return None
+    
+    async def get_available_currencies(self) -> Optional[List[str]]:
+        """Async version of NOWPaymentsManager.get_available_currencies"""
+        cached = self._cache_get(self._currencies_cache, 'all')
+        if cached is not None:
+            return list(cached)
+        
+        data = await self._request('GET', '/currencies')
+        if data is None:
+            return None
+        currencies = data.get('currencies', [])
+        self._cache_set(self._currencies_cache, 'all', tuple(currencies))
+        return currencies
+    
+    async def get_minimum_payment_amount(self, currency_from: str, currency_to: str) -> Optional[float]:
+        """Async version of NOWPaymentsManager.get_minimum_payment_amount"""
+        cache_key = (self._lc(currency_from), self._lc(currency_to))
+        cached = self._cache_get(self._min_amount_cache, cache_key)
+        if cached is not None:
+            return cached
+        
+        data = await self._request('GET', '/min-amount', params={
+            'currency_from': currency_from,
+            'currency_to': currency_to
+        })
+        if data is None:
+            return None
+        min_amount = float(data.get('min_amount', 0))
+        self._cache_set(self._min_amount_cache, cache_key, min_amount)
+        return min_amount
+    
+    async def get_estimate_price(self, amount: float, currency_from: str, currency_to: str) -> Optional[Dict[str, Any]]:
+        """Async version of NOWPaymentsManager.get_estimate_price"""
+        return await self._request('GET', '/estimate', params={
+            'amount': amount,
+            'currency_from': self._lc(currency_from),
+            'currency_to': self._lc(currency_to)
+        })
+    
+    async def get_payment_status(self, payment_id: int) -> Optional[Dict[str, Any]]:
+        """Async version of NOWPaymentsManager.get_payment_status"""
+        return await self._request('GET', f'/payment/{payment_id}')
+    
+    async def batch_estimates(self, pairs: List[tuple]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Get estimates for several currency pairs concurrently
+        
+        Args:
+            pairs: List of (amount, currency_from, currency_to) tuples
+            
+        Returns:
+            List of estimate dicts (None for failed pairs) in the same order
+        """
+        return await asyncio.gather(*[
+            self.get_estimate_price(amount, currency_from, currency_to)
+            for amount, currency_from, currency_to in pairs
+        ])
+
 # Global instance of NOWPayments manager
 nowpayments_manager = NOWPaymentsManager()
 
@@ -21,17 +21,23 @@ def check_supabase_connection():
         print(f"❌ Ошибка при проверке Supabase: {e}")
         return False
 
+def is_supabase_configured(env=os.environ):
+    """
+    Проверяет, заданы ли переменные Supabase
+    
+    Влияет только на проверку подключения и вывод: supabase_client уже
+    импортирован через app, так что импорт SDK это не откладывает.
+    """
+    return bool(env.get('SUPABASE_URL') and env.get('SUPABASE_KEY'))
+
 def check_environment():
     """Проверяет настройки окружения"""
     print("🔍 Проверка настроек окружения...")
+    env = os.environ
     
     # Проверяем основные переменные
     required_vars = ['SECRET_KEY']
-    missing_vars = []
-    
-    for var in required_vars:
-        if not os.getenv(var):
-            missing_vars.append(var)
+    missing_vars = [var for var in required_vars if not env.get(var)]
     
     if missing_vars:
         print(f"⚠️  Отсутствуют переменные окружения: {', '.join(missing_vars)}")
@@ -40,17 +46,52 @@ def check_environment():
         print("✅ Основные переменные окружения настроены")
     
     # Проверяем Supabase
-    if os.getenv('SUPABASE_URL') and os.getenv('SUPABASE_KEY'):
+    if is_supabase_configured(env):
         print("✅ Supabase настроен")
     else:
         print("⚠️  Supabase не настроен (опционально)")
     
     # Проверяем Stripe
-    if os.getenv('STRIPE_SECRET_KEY') and os.getenv('STRIPE_PUBLISHABLE_KEY'):
+    if env.get('STRIPE_SECRET_KEY') and env.get('STRIPE_PUBLISHABLE_KEY'):
         print("✅ Stripe настроен")
     else:
         print("⚠️  Stripe не настроен (опционально)")
 
+def run_production_server(port):
+    """
+    Запускает приложение под gunicorn (те же настройки, что и в Procfile)
+    
+    Args:
+        port: Порт для прослушивания
+    """
+    from gunicorn.app.base import BaseApplication
+    
+    class StandaloneApplication(BaseApplication):
+        def __init__(self, application, options):
+            self.application = application
+            self.options = options
+            super().__init__()
+        
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+        
+        def load(self):
+            return self.application
+    
+    # Один процесс (как -w 1 в Procfile/render.yaml): кэши и пулы соединений живут в памяти процесса
+    options = {
+        'bind': f'0.0.0.0:{port}',
+        'workers': 1,
+        'worker_class': 'gthread',
+        'threads': 8,
+        'timeout': 600,
+        'graceful_timeout': 300,
+        'keepalive': 5,
+    }
+    print(f"🌐 Production-сервер (gunicorn) на порту {port}")
+    StandaloneApplication(app, options).run()
+
 def main():
     """Основная функция запуска"""
     print("🚀 Запуск Flask приложения...")
@@ -60,22 +101,28 @@ def main():
     check_environment()
     print()
     
-    # Проверяем подключение к Supabase
-    print("📊 Проверка подключения к Supabase...")
-    if not check_supabase_connection():
-        print("⚠️  Приложение будет работать с ограниченным функционалом")
-    print()
+    # Проверяем подключение к Supabase (только если он настроен; пропускается лишь сам запрос)
+    if is_supabase_configured():
+        print("📊 Проверка подключения к Supabase...")
+        if not check_supabase_connection():
+            print("⚠️  Приложение будет работать с ограниченным функционалом")
+        print()
     
     # Запускаем приложение
-    port = app.config.get('PORT', 3000)
+    port = int(app.config.get('PORT', 3000))
+    debug = os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
+    
+    if os.getenv('FLASK_ENV') == 'production':
+        run_production_server(port)
+        return
+    
     print(f"🌐 Приложение доступно по адресу: http://localhost:{port}")
     print("📝 Для остановки нажмите Ctrl+C")
     print("=" * 50)
     
     try:
-        port = app.config.get('PORT', 3000)
         app.run(
-            debug=os.getenv('FLASK_DEBUG', 'True').lower() == 'true',
+            debug=debug,
             host='0.0.0.0',
             port=port
         )
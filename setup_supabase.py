@@ -6,18 +6,64 @@ Helps diagnose and fix Supabase authentication issues
 
 import os
 import sys
+from functools import lru_cache
 from dotenv import load_dotenv
 from supabase import create_client
+from supabase.lib.client_options import ClientOptions
+import httpx
+from gotrue.errors import AuthApiError, AuthError
 import logging
 
+@lru_cache(maxsize=1)
+def _load_env_once():
+    """Load .env a single time per process (re-imports reuse the result)"""
+    load_dotenv()
+    return True
+
 # Load environment variables
-load_dotenv()
+_load_env_once()
+
+# Snapshot of the Supabase settings, read once after load_dotenv()
+_ENV = {k: os.environ.get(k) for k in ('SUPABASE_URL', 'SUPABASE_KEY')}
 
 # Setup logging
 logging.basicConfig(level=logging.WARNING, format='%(levelname)s: %(message)s')
 logger = logging.getLogger(__name__)
 
-def check_environment():
+# Hints for known sign-up failures, keyed by GoTrue error code
+_HINTS = {
+    'user_already_exists': (logging.INFO, (
+        "💡 This might be normal - test email already exists",
+    )),
+    'unexpected_failure': (logging.ERROR, (
+        "💡 Database error - check your Supabase schema setup",
+        "Run the SQL from supabase_schema_fix.sql in your Supabase SQL Editor",
+    )),
+    'email_not_confirmed': (logging.ERROR, (
+        "💡 Email confirmation required",
+        "Go to Supabase > Authentication > Settings and disable email confirmations for development",
+    )),
+}
+
+# Older GoTrue servers/clients do not expose error codes; map known messages instead
+_MESSAGE_CODES = (
+    ('already registered', 'user_already_exists'),
+    ('database error', 'unexpected_failure'),
+    ('email not confirmed', 'email_not_confirmed'),
+)
+
+def _auth_error_code(error):
+    """Return the GoTrue error code for an auth error (or None)"""
+    code = getattr(error, 'code', None)
+    if code:
+        return code
+    message = error.message.lower()
+    for needle, code in _MESSAGE_CODES:
+        if needle in message:
+            return code
+    return None
+
+def check_environment(env=_ENV):
     """Check if all required environment variables are set"""
     logger.info("🔍 Checking environment variables...")
     
@@ -25,13 +71,13 @@ def check_environment():
     missing_vars = []
     
     for var in required_vars:
-        value = os.getenv(var)
+        value = env.get(var)
         if not value:
             missing_vars.append(var)
         else:
             # Show partial key for security
             if 'KEY' in var:
-                display_value = value[:10] + '...' + value[-4:] if len(value) > 14 else value
+                display_value = f"{value[:10]}...{value[-4:]}" if len(value) > 14 else value
             else:
                 display_value = value
             logger.info(f"  ✅ {var}: {display_value}")
@@ -46,15 +92,39 @@ def check_environment():
     logger.info("✅ All environment variables are set")
     return True
 
-def test_connection():
+# Shared Supabase client settings. REST/Storage go through httpx, not a DB
+# driver pool, so SQLAlchemy-style pool_size/max_overflow do not apply; the
+# httpx pool limits live in supabase_client.py.
+SUPABASE_CLIENT_TIMEOUT = 30
+SUPABASE_SCHEMA = 'public'
+
+def make_supabase_options():
+    """
+    Build ClientOptions with the shared settings
+    
+    A new object is returned on every call: supabase-py writes the API key
+    into options.headers, so one ClientOptions must not be shared between clients.
+    """
+    return ClientOptions(
+        postgrest_client_timeout=SUPABASE_CLIENT_TIMEOUT,
+        storage_client_timeout=SUPABASE_CLIENT_TIMEOUT,
+        schema=SUPABASE_SCHEMA
+    )
+
+@lru_cache(maxsize=1)
+def get_supabase_client(url, key):
+    """Create the Supabase client once and reuse its pooled HTTP session"""
+    return create_client(url, key, options=make_supabase_options())
+
+def test_connection(env=_ENV):
     """Test connection to Supabase"""
     logger.info("🔗 Testing Supabase connection...")
     
     try:
-        url = os.getenv('SUPABASE_URL')
-        key = os.getenv('SUPABASE_KEY')
+        url = env['SUPABASE_URL']
+        key = env['SUPABASE_KEY']
         
-        client = create_client(url, key)
+        client = get_supabase_client(url, key)
         
         # Test basic connection by attempting to get auth user (will fail but should connect)
         try:
@@ -94,7 +164,7 @@ def test_registration(client):
             # Clean up: sign out
             try:
                 client.auth.sign_out()
-            except:
+            except (AuthError, httpx.HTTPError):
                 pass
                 
             return True
@@ -102,46 +172,48 @@ def test_registration(client):
             logger.error("❌ Registration failed - no user in response")
             return False
             
-    except Exception as e:
+    except AuthApiError as e:
         logger.error(f"❌ Registration test failed: {e}")
-        logger.error(f"Exception type: {type(e)}")
+        logger.error(f"Exception type: {type(e)} (status {e.status})")
         
         # Check if it's a specific error we can help with
-        error_str = str(e).lower()
-        if "email already registered" in error_str:
-            logger.info("💡 This might be normal - test email already exists")
-        elif "database error" in error_str:
-            logger.error("💡 Database error - check your Supabase schema setup")
-            logger.error("Run the SQL from supabase_schema_fix.sql in your Supabase SQL Editor")
-        elif "email not confirmed" in error_str:
-            logger.error("💡 Email confirmation required")
-            logger.error("Go to Supabase > Authentication > Settings and disable email confirmations for development")
+        hint = _HINTS.get(_auth_error_code(e))
+        if hint:
+            level, lines = hint
+            for line in lines:
+                logger.log(level, line)
         
         return False
+    except Exception as e:
+        logger.error(f"❌ Registration test failed: {e}")
+        logger.error(f"Exception type: {type(e)}")
+        return False
 
 def check_auth_settings():
     """Provide guidance on auth settings"""
-    logger.info("⚙️  Authentication Settings Checklist:")
-    logger.info("   Go to your Supabase dashboard > Authentication > Settings")
-    logger.info("   The app now automatically uses the correct URLs based on FLASK_ENV:")
-    logger.info("   ")
     dev_url = os.getenv('DEV_BASE_URL', 'http://localhost:3000')
-    logger.info("   For DEVELOPMENT (FLASK_ENV=development):")
-    logger.info(f"   1. ✅ Site URL: {dev_url}")
-    logger.info("   2. ✅ Auto Confirm: Enable for development")
-    logger.info("   3. ✅ Email Confirmations: Disable for development") 
-    logger.info("   4. ✅ Phone Confirmations: Disable for development")
-    logger.info(f"   5. ✅ Redirect URLs: Add {dev_url}/callback")
-    logger.info("   ")
-    logger.info("   For PRODUCTION (FLASK_ENV=production):")
-    logger.info("   1. ✅ Site URL: https://glitchpeach.com")
-    logger.info("   2. ✅ Auto Confirm: Disable (enable email confirmations)")
-    logger.info("   3. ✅ Email Confirmations: Enable")
-    logger.info("   4. ✅ Phone Confirmations: Disable")
-    logger.info("   5. ✅ Redirect URLs: Add https://glitchpeach.com/callback")
-    logger.info("   ")
-    logger.info("   💡 The email confirmation redirect URL is now automatically")
-    logger.info("      determined by the FLASK_ENV environment variable!")
+    logger.info("\n".join([
+        "⚙️  Authentication Settings Checklist:",
+        "   Go to your Supabase dashboard > Authentication > Settings",
+        "   The app now automatically uses the correct URLs based on FLASK_ENV:",
+        "   ",
+        "   For DEVELOPMENT (FLASK_ENV=development):",
+        f"   1. ✅ Site URL: {dev_url}",
+        "   2. ✅ Auto Confirm: Enable for development",
+        "   3. ✅ Email Confirmations: Disable for development",
+        "   4. ✅ Phone Confirmations: Disable for development",
+        f"   5. ✅ Redirect URLs: Add {dev_url}/callback",
+        "   ",
+        "   For PRODUCTION (FLASK_ENV=production):",
+        "   1. ✅ Site URL: https://glitchpeach.com",
+        "   2. ✅ Auto Confirm: Disable (enable email confirmations)",
+        "   3. ✅ Email Confirmations: Enable",
+        "   4. ✅ Phone Confirmations: Disable",
+        "   5. ✅ Redirect URLs: Add https://glitchpeach.com/callback",
+        "   ",
+        "   💡 The email confirmation redirect URL is now automatically",
+        "      determined by the FLASK_ENV environment variable!",
+    ]))
 
 def check_database_schema():
     """Check if database schema is set up correctly"""
@@ -2,19 +2,112 @@
 Модуль для работы со Stripe (заглушки для будущей интеграции)
 """
 import os
+import time
+import random
 import logging
+import threading
+import uuid
+from contextlib import contextmanager
+from collections import namedtuple
+from functools import lru_cache, wraps
 from typing import Optional, Dict, Any
+import orjson
 import stripe
+from cachetools import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# Статические параметры подписки (не изменять: передаются в каждый вызов как есть)
+_SUB_PAYMENT_BEHAVIOR = 'default_incomplete'
+_SUB_PAYMENT_SETTINGS = {'save_default_payment_method': 'on_subscription'}
+_SUB_EXPAND = ('latest_invoice.payment_intent',)
+
+_StripeEnv = namedtuple('_StripeEnv', ['publishable_key', 'secret_key', 'webhook_secret'])
+
+@lru_cache(maxsize=1)
+def _env() -> _StripeEnv:
+    """Читает настройки Stripe из окружения один раз за процесс"""
+    return _StripeEnv(
+        os.environ.get('STRIPE_PUBLISHABLE_KEY'),
+        os.environ.get('STRIPE_SECRET_KEY'),
+        os.environ.get('STRIPE_WEBHOOK_SECRET')
+    )
+
+def _is_retryable_stripe_error(error: Exception) -> bool:
+    """Сетевые сбои, rate limit/lock_timeout (429) и 503 можно повторить"""
+    if isinstance(error, (stripe.error.APIConnectionError, stripe.error.RateLimitError)):
+        return True
+    return isinstance(error, stripe.error.APIError) and error.http_status == 503
+
+def retry_stripe(max_retries: int = 3, base_delay: float = 1.0, jitter: float = 0.5, cap: float = 30.0):
+    """
+    Декоратор: повтор вызова Stripe API с экспоненциальной задержкой и jitter
+    
+    Повторяются только временные ошибки (см. _is_retryable_stripe_error),
+    остальные исключения пробрасываются сразу. Заголовок Retry-After
+    учитывается, если Stripe его вернул.
+    
+    Args:
+        max_retries: Максимальное число повторов
+        base_delay: Базовая задержка в секундах
+        jitter: Доля случайной добавки к задержке
+        cap: Максимальная задержка в секундах
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            for attempt in range(max_retries + 1):
+                try:
+                    return func(*args, **kwargs)
+                except stripe.error.StripeError as e:
+                    if attempt >= max_retries or not _is_retryable_stripe_error(e):
+                        raise
+                    delay = min(cap, base_delay * 2 ** attempt) * (1 + random.random() * jitter)
+                    retry_after = (e.headers or {}).get('Retry-After')
+                    if retry_after:
+                        try:
+                            delay = min(cap, max(delay, float(retry_after)))
+                        except ValueError:
+                            pass
+                    logger.warning("Временная ошибка Stripe (%s), повтор %s/%s через %.1fс", type(e).__name__, attempt + 1, max_retries, delay)
+                    time.sleep(delay)
+        return wrapper
+    return decorator
+
+@contextmanager
+def _stripe_call(description: str):
+    """
+    Логирует и подавляет ошибки вызова Stripe API
+    
+    Заменяет повторяющиеся блоки try/except в методах StripeManager:
+    при ошибке выполнение продолжается после блока with, где метод
+    возвращает значение по умолчанию (None/False).
+    
+    Args:
+        description: Описание операции для лога (например, 'при создании клиента')
+    """
+    try:
+        yield
+    except stripe.error.StripeError as e:
+        logger.error("Ошибка Stripe %s: %s", description, e)
+    except Exception as e:
+        logger.error("Общая ошибка %s: %s", description, e)
+
 class StripeManager:
     """Класс для управления интеграцией со Stripe"""
     
     def __init__(self):
-        self.publishable_key = os.getenv('STRIPE_PUBLISHABLE_KEY')
-        self.secret_key = os.getenv('STRIPE_SECRET_KEY')
-        self.webhook_secret = os.getenv('STRIPE_WEBHOOK_SECRET')
+        env = _env()
+        self.publishable_key = env.publishable_key
+        self.secret_key = env.secret_key
+        self.webhook_secret = env.webhook_secret
+        self._configured = bool(self.secret_key and self.publishable_key)
+        
+        # email (lowercase) -> customer id; данные клиента всегда берутся свежими
+        self._customer_id_cache = TTLCache(maxsize=10_000, ttl=300)
+        # customer id -> объект клиента (короткий TTL, сбрасывается по webhook)
+        self._customer_cache = TTLCache(maxsize=5000, ttl=60)
+        self._cache_lock = threading.Lock()
         
         if self.secret_key:
             stripe.api_key = self.secret_key
@@ -24,24 +117,41 @@ class StripeManager:
     
     def is_configured(self) -> bool:
         """Проверяет, настроен ли Stripe"""
-        return bool(self.secret_key and self.publishable_key)
+        return self._configured
+    
+    @staticmethod
+    @retry_stripe(max_retries=3, base_delay=1.0, jitter=0.5, cap=30)
+    def _request(func, *args, **kwargs):
+        """Единая точка вызова Stripe API (с повторами временных ошибок)"""
+        return func(*args, **kwargs)
+    
+    def _retrieve_customer(self, customer_id: str):
+        """Получает клиента по ID с кэшированием (исключения Stripe пробрасываются)"""
+        with self._cache_lock:
+            customer = self._customer_cache.get(customer_id)
+        if customer is None:
+            customer = self._request(stripe.Customer.retrieve, customer_id)
+            with self._cache_lock:
+                self._customer_cache[customer_id] = customer
+        return customer
     
-    def create_customer(self, email: str, name: str = None) -> Optional[Dict[str, Any]]:
+    def create_customer(self, email: str, name: str = None, idempotency_key: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """
         Создает клиента в Stripe
         
         Args:
             email: Email клиента
             name: Имя клиента (опционально)
+            idempotency_key: Ключ идемпотентности (по умолчанию генерируется UUID4)
             
         Returns:
             Словарь с данными клиента или None при ошибке
         """
-        if not self.is_configured():
+        if not self._configured:
             logger.error("Stripe не настроен")
             return None
         
-        try:
+        with _stripe_call("при создании клиента"):
             customer_data = {
                 'email': email,
             }
@@ -49,18 +159,20 @@ class StripeManager:
             if name:
                 customer_data['name'] = name
             
-            customer = stripe.Customer.create(**customer_data)
-            logger.info(f"Клиент Stripe создан: {customer.id}")
+            customer = self._request(
+                stripe.Customer.create,
+                idempotency_key=idempotency_key or str(uuid.uuid4()),
+                **customer_data
+            )
+            logger.info("Клиент Stripe создан: %s", customer.id)
+            with self._cache_lock:
+                self._customer_id_cache[email.lower()] = customer.id
             return customer
-            
-        except stripe.error.StripeError as e:
-            logger.error(f"Ошибка Stripe при создании клиента: {e}")
-            return None
-        except Exception as e:
-            logger.error(f"Общая ошибка при создании клиента Stripe: {e}")
-            return None
+        
+        return None
     
-    def create_payment_intent(self, amount: int, currency: str = 'usd', customer_id: str = None) -> Optional[Dict[str, Any]]:
+    def create_payment_intent(self, amount: int, currency: str = 'usd', customer_id: str = None,
+                              idempotency_key: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """
         Создает намерение платежа
         
@@ -68,15 +180,16 @@ class StripeManager:
             amount: Сумма в центах
             currency: Валюта (по умолчанию USD)
             customer_id: ID клиента (опционально)
+            idempotency_key: Ключ идемпотентности (по умолчанию генерируется UUID4)
             
         Returns:
             Словарь с данными намерения платежа или None при ошибке
         """
-        if not self.is_configured():
+        if not self._configured:
             logger.error("Stripe не настроен")
             return None
         
-        try:
+        with _stripe_call("при создании намерения платежа"):
             intent_data = {
                 'amount': amount,
                 'currency': currency,
@@ -88,52 +201,47 @@ class StripeManager:
             if customer_id:
                 intent_data['customer'] = customer_id
             
-            intent = stripe.PaymentIntent.create(**intent_data)
-            logger.info(f"Намерение платежа создано: {intent.id}")
+            intent = self._request(
+                stripe.PaymentIntent.create,
+                idempotency_key=idempotency_key or str(uuid.uuid4()),
+                **intent_data
+            )
+            logger.info("Намерение платежа создано: %s", intent.id)
             return intent
-            
-        except stripe.error.StripeError as e:
-            logger.error(f"Ошибка Stripe при создании намерения платежа: {e}")
-            return None
-        except Exception as e:
-            logger.error(f"Общая ошибка при создании намерения платежа: {e}")
-            return None
+        
+        return None
     
-    def create_subscription(self, customer_id: str, price_id: str) -> Optional[Dict[str, Any]]:
+    def create_subscription(self, customer_id: str, price_id: str, idempotency_key: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """
         Создает подписку
         
         Args:
             customer_id: ID клиента
             price_id: ID цены/плана
+            idempotency_key: Ключ идемпотентности (по умолчанию генерируется UUID4)
             
         Returns:
             Словарь с данными подписки или None при ошибке
         """
-        if not self.is_configured():
+        if not self._configured:
             logger.error("Stripe не настроен")
             return None
         
-        try:
-            subscription = stripe.Subscription.create(
+        with _stripe_call("при создании подписки"):
+            subscription = self._request(
+                stripe.Subscription.create,
+                idempotency_key=idempotency_key or str(uuid.uuid4()),
                 customer=customer_id,
-                items=[{
-                    'price': price_id,
-                }],
-                payment_behavior='default_incomplete',
-                payment_settings={'save_default_payment_method': 'on_subscription'},
-                expand=['latest_invoice.payment_intent'],
+                items=({'price': price_id},),
+                payment_behavior=_SUB_PAYMENT_BEHAVIOR,
+                payment_settings=_SUB_PAYMENT_SETTINGS,
+                expand=_SUB_EXPAND,
             )
             
-            logger.info(f"Подписка создана: {subscription.id}")
+            logger.info("Подписка создана: %s", subscription.id)
             return subscription
-            
-        except stripe.error.StripeError as e:
-            logger.error(f"Ошибка Stripe при создании подписки: {e}")
-            return None
-        except Exception as e:
-            logger.error(f"Общая ошибка при создании подписки: {e}")
-            return None
+        
+        return None
     
     def get_customer(self, customer_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -145,18 +253,13 @@ class StripeManager:
         Returns:
             Словарь с данными клиента или None при ошибке
         """
-        if not self.is_configured():
+        if not self._configured:
             return None
         
-        try:
-            customer = stripe.Customer.retrieve(customer_id)
-            return customer
-        except stripe.error.StripeError as e:
-            logger.error(f"Ошибка Stripe при получении клиента: {e}")
-            return None
-        except Exception as e:
-            logger.error(f"Общая ошибка при получении клиента: {e}")
-            return None
+        with _stripe_call("при получении клиента"):
+            return self._retrieve_customer(customer_id)
+        
+        return None
     
     def get_customer_by_email(self, email: str) -> Optional[Dict[str, Any]]:
         """
@@ -168,18 +271,53 @@ class StripeManager:
         Returns:
             Словарь с данными клиента или None при ошибке
         """
-        if not self.is_configured():
+        if not self._configured:
             return None
         
-        try:
-            customers = stripe.Customer.list(email=email, limit=1)
-            return customers.data[0] if customers.data else None
-        except stripe.error.StripeError as e:
-            logger.error(f"Ошибка Stripe при поиске клиента по email: {e}")
-            return None
-        except Exception as e:
-            logger.error(f"Общая ошибка при поиске клиента по email: {e}")
-            return None
+        cache_key = email.lower()
+        
+        with _stripe_call("при поиске клиента по email"):
+            with self._cache_lock:
+                customer_id = self._customer_id_cache.get(cache_key)
+            if customer_id:
+                customer = self._retrieve_customer(customer_id)
+                if not getattr(customer, 'deleted', False):
+                    return customer
+                self.invalidate_customer_email(email)
+            
+            customers = self._request(stripe.Customer.list, email=email, limit=1)
+            if not customers.data:
+                return None
+            customer = customers.data[0]
+            with self._cache_lock:
+                self._customer_id_cache[cache_key] = customer.id
+            return customer
+        
+        return None
+    
+    def invalidate_customer_email(self, email: str) -> None:
+        """
+        Сбрасывает кэш email -> customer id (например, из webhook customer.updated/deleted)
+        
+        Args:
+            email: Email клиента
+        """
+        if not email:
+            return
+        with self._cache_lock:
+            self._customer_id_cache.pop(email.lower(), None)
+    
+    def invalidate_customer(self, customer_id: str) -> None:
+        """
+        Сбрасывает кэш данных клиента (например, из webhook customer.updated/deleted)
+        
+        Args:
+            customer_id: ID клиента
+        """
+        if not customer_id:
+            return
+        with self._cache_lock:
+            self._customer_cache.pop(customer_id, None)
     
     def cancel_subscription(self, subscription_id: str) -> bool:
         """
@@ -191,47 +329,78 @@ class StripeManager:
         Returns:
             True если отмена прошла успешно, False в противном случае
         """
-        if not self.is_configured():
+        if not self._configured:
             return False
         
-        try:
-            stripe.Subscription.delete(subscription_id)
-            logger.info(f"Подписка {subscription_id} отменена")
+        with _stripe_call("при отмене подписки"):
+            self._request(stripe.Subscription.delete, subscription_id)
+            logger.info("Подписка %s отменена", subscription_id)
             return True
-        except stripe.error.StripeError as e:
-            logger.error(f"Ошибка Stripe при отмене подписки: {e}")
-            return False
-        except Exception as e:
-            logger.error(f"Общая ошибка при отмене подписки: {e}")
-            return False
+        
+        return False
+    
+    def get_checkout_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Получает сессию Checkout
+        
+        Args:
+            session_id: ID сессии Checkout
+            
+        Returns:
+            Объект сессии или None при ошибке
+        """
+        if not self._configured:
+            return None
+        
+        with _stripe_call("при получении сессии Checkout"):
+            return self._request(stripe.checkout.Session.retrieve, session_id)
+        
+        return None
+    
+    def list_checkout_line_items(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Получает позиции сессии Checkout
+        
+        Args:
+            session_id: ID сессии Checkout
+            
+        Returns:
+            Список позиций (ListObject) или None при ошибке
+        """
+        if not self._configured:
+            return None
+        
+        with _stripe_call("при получении позиций сессии Checkout"):
+            return self._request(stripe.checkout.Session.list_line_items, session_id)
+        
+        return None
     
-    def create_webhook_endpoint(self, url: str, events: list) -> Optional[Dict[str, Any]]:
+    def create_webhook_endpoint(self, url: str, events: list, idempotency_key: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """
         Создает webhook endpoint
         
         Args:
             url: URL для webhook
             events: Список событий для отслеживания
+            idempotency_key: Ключ идемпотентности (по умолчанию генерируется UUID4)
             
         Returns:
             Словарь с данными webhook или None при ошибке
         """
-        if not self.is_configured():
+        if not self._configured:
             return None
         
-        try:
-            endpoint = stripe.WebhookEndpoint.create(
+        with _stripe_call("при создании webhook"):
+            endpoint = self._request(
+                stripe.WebhookEndpoint.create,
+                idempotency_key=idempotency_key or str(uuid.uuid4()),
                 url=url,
                 enabled_events=events,
             )
-            logger.info(f"Webhook endpoint создан: {endpoint.id}")
+            logger.info("Webhook endpoint создан: %s", endpoint.id)
             return endpoint
-        except stripe.error.StripeError as e:
-            logger.error(f"Ошибка Stripe при создании webhook: {e}")
-            return None
-        except Exception as e:
-            logger.error(f"Общая ошибка при создании webhook: {e}")
-            return None
+        
+        return None
     
     def verify_webhook_signature(self, payload: str, signature: str) -> bool:
         """
@@ -254,20 +423,37 @@ class StripeManager:
             return False
         
         try:
-            stripe.Webhook.construct_event(
-                payload, signature, self.webhook_secret
+            # Только проверка подписи, без разбора JSON (см. parse_event)
+            if hasattr(payload, 'decode'):
+                payload = payload.decode('utf-8')
+            stripe.WebhookSignature.verify_header(
+                payload, signature, self.webhook_secret, stripe.Webhook.DEFAULT_TOLERANCE
             )
             logger.info("Webhook signature verified successfully")
             return True
         except ValueError as e:
-            logger.error(f"Invalid payload: {e}")
+            logger.error("Invalid payload: %s", e)
             return False
         except stripe.error.SignatureVerificationError as e:
-            logger.error(f"Webhook signature verification failed: {e}")
+            logger.error("Webhook signature verification failed: %s", e)
             return False
         except Exception as e:
-            logger.error(f"Error during webhook signature verification: {e}")
+            logger.error("Error during webhook signature verification: %s", e)
             return False
+    
+    def parse_event(self, payload) -> stripe.Event:
+        """
+        Разбирает тело webhook в объект stripe.Event (подпись должна быть уже проверена)
+        
+        Args:
+            payload: Тело запроса (bytes или str)
+            
+        Returns:
+            Объект stripe.Event
+        """
+        return stripe.Event.construct_from(orjson.loads(payload), stripe.api_key)
 
-# Глобальный экземпляр менеджера Stripe
-stripe_manager = StripeManager()
+@lru_cache(maxsize=1)
+def get_stripe_manager() -> StripeManager:
+    """Возвращает единственный экземпляр StripeManager (создается при первом вызове)"""
+    return StripeManager()
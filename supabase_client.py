@@ -1,18 +1,46 @@
 """
 Supabase Client Module
 """
+import copy
+import importlib.util
 import os
 import uuid
 import re
-from datetime import datetime
-from supabase import create_client, Client
-from typing import Optional, Dict, Any, List
+import threading
+import random
+import time
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+from functools import cached_property, lru_cache, wraps
+from operator import itemgetter
+from io import BufferedReader, FileIO
+from pathlib import Path
+from concurrent.futures import Future, ThreadPoolExecutor
+from cachetools import TTLCache
+import httpx
+import orjson
+from supabase import Client
+from supabase.lib.client_options import ClientOptions
+from postgrest.exceptions import APIError
+from postgrest.types import ReturnMethod
+from typing import Optional, Dict, Any, List, Union, BinaryIO
 import logging
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+_SupabaseEnv = namedtuple('_SupabaseEnv', ['url', 'key', 'service_role_key'])
+
+@lru_cache(maxsize=1)
+def _env() -> _SupabaseEnv:
+    """Reads the Supabase settings from the environment once per process"""
+    return _SupabaseEnv(
+        os.environ.get('SUPABASE_URL'),
+        os.environ.get('SUPABASE_KEY'),
+        os.environ.get('SUPABASE_SERVICE_ROLE_KEY')
+    )
+
 # Configure logging to WARNING level to reduce verbose output
 logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger(__name__)
@@ -20,6 +48,222 @@ logger = logging.getLogger(__name__)
 # Disable verbose httpx logging
 logging.getLogger("httpx").setLevel(logging.WARNING)
 
+# Columns of user_data used by the app (avoid shipping unused columns on hot reads)
+USER_DATA_COLUMNS = 'id,user_id,data_type,data_content,filename,title,description,thumbnail_url,created_at,updated_at'
+
+# List projection for user_data (feeds, search, profile): everything but data_content.
+# Fetch the body via get_game_content / get_game_by_id when it is actually needed.
+GAME_LIST_COLUMNS = 'id,user_id,data_type,filename,title,description,thumbnail_url,created_at,updated_at'
+
+# Keep-alive pool for PostgREST/Storage HTTP traffic (TLS handshakes amortized across requests).
+# Tunable per deployment; defaults suit one gunicorn worker with 8 threads.
+HTTP_POOL_LIMITS = httpx.Limits(
+    max_keepalive_connections=int(os.getenv('SUPABASE_MAX_KEEPALIVE', '20')),
+    max_connections=int(os.getenv('SUPABASE_MAX_CONNECTIONS', '50')),
+    keepalive_expiry=float(os.getenv('SUPABASE_KEEPALIVE_EXPIRY', '30'))
+)
+
+# Object paths inside the game-files bucket, taken from public/signed storage URLs
+# URL format: https://xxx.supabase.co/storage/v1/object/public/game-files/games/user_id/file_id.html
+_GAME_FILE_RE = re.compile(r'/game-files/(games/[^?#]+)')
+_THUMBNAIL_RE = re.compile(r'/game-files/(thumbnails/[^?#]+)')
+
+# Allowed nickname characters: alphanumeric, spaces, hyphens, underscores
+_NICKNAME_RE = re.compile(r'[a-zA-Z0-9\s\-_]+')
+
+# Keyset cursor for get_all_uploaded_games: "<created_at>|<id>" of the last row on a page.
+# Only timestamp and id characters are accepted, so the parts are safe inside a PostgREST filter.
+_GAMES_CURSOR_RE = re.compile(r'([0-9T:.+\- ]+)\|([0-9A-Za-z\-]+)')
+
+# HTTP/2 multiplexes concurrent PostgREST/Storage calls over one connection (needs the h2 package)
+HTTP2_ENABLED = importlib.util.find_spec('h2') is not None
+
+# PostgREST / Postgres error codes for a function that is not installed (SQL not applied yet)
+_MISSING_FUNCTION_CODES = ('PGRST202', '42883')
+
+# Error codes for a relation (table/view) that does not exist yet
+_MISSING_RELATION_CODES = ('42P01', 'PGRST205')
+
+# Postgres error code for a column that does not exist (e.g. a view created by an older SQL file)
+_UNDEFINED_COLUMN_CODE = '42703'
+
+# Postgres error code for ON CONFLICT without a matching unique index (upsert migration not applied)
+_NO_CONFLICT_TARGET_CODE = '42P10'
+
+# Sort keys accepted by the games_with_stats view
+_GAME_SORT_FIELDS = ('created_at', 'likes_count', 'plays_count')
+
+# Connection-level retries (connect errors / stale keep-alive sockets); requests are not replayed
+HTTP_TRANSPORT_RETRIES = 3
+
+# Cache sentinel: users without a nickname are cached as None, so None can't mean "not cached"
+_NOT_CACHED = object()
+
+# Max IDs per PostgREST in.(...) filter (UUIDs are ~37 bytes each in the query string)
+_IN_FILTER_BATCH = 200
+
+# Page size for GoTrue admin list_users (its default page is only 50 users)
+_AUTH_USERS_PAGE_SIZE = 1000
+
+def _orjson_response_hook(response: httpx.Response) -> None:
+    """
+    httpx response hook: decode JSON bodies with orjson instead of stdlib json
+    
+    postgrest/storage3 call response.json(); orjson.JSONDecodeError subclasses
+    json.JSONDecodeError, so their empty-body handling keeps working.
+    """
+    response.json = lambda **kwargs: orjson.loads(response.content)
+
+def _use_pooled_session(owner: Any, attr: str) -> None:
+    """
+    Replaces an httpx session of a postgrest/storage client with a pooled one
+    
+    The new session keeps base_url, headers and timeout, and adds HTTP_POOL_LIMITS
+    (set on the transport, where httpx enforces it), connect retries, HTTP/2 and
+    orjson response decoding.
+    
+    Args:
+        owner: SyncPostgrestClient or storage client
+        attr: Attribute holding the httpx session ('session' / '_client')
+    """
+    try:
+        old_session = getattr(owner, attr)
+        setattr(owner, attr, type(old_session)(
+            base_url=old_session.base_url,
+            headers=old_session.headers,
+            timeout=old_session.timeout,
+            transport=httpx.HTTPTransport(limits=HTTP_POOL_LIMITS, retries=HTTP_TRANSPORT_RETRIES, http2=HTTP2_ENABLED),
+            event_hooks={'response': [_orjson_response_hook]}
+        ))
+        old_session.close()
+    except Exception as e:
+        logger.warning("Could not configure Supabase HTTP pool, using defaults: %s", e)
+
+class _PooledClient(Client):
+    """
+    Supabase client whose PostgREST and Storage sessions use the tuned httpx pool
+    
+    supabase-py 2.0 has no option for passing a custom httpx client, and it drops
+    its postgrest/storage clients on SIGNED_IN, TOKEN_REFRESHED and SIGNED_OUT,
+    rebuilding them through these factories. Hooking the factories keeps the pool
+    settings on every rebuilt client instead of only the first one.
+    """
+    
+    @staticmethod
+    def _init_postgrest_client(*args, **kwargs):
+        postgrest = Client._init_postgrest_client(*args, **kwargs)
+        _use_pooled_session(postgrest, 'session')
+        return postgrest
+    
+    @staticmethod
+    def _init_storage_client(*args, **kwargs):
+        storage = Client._init_storage_client(*args, **kwargs)
+        _use_pooled_session(storage, '_client')
+        return storage
+
+# Shared pool for overlapping independent Supabase round trips within one request.
+# httpx clients are thread-safe, so queries can run in parallel on the pooled clients.
+_io_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='supabase-io')
+
+# Upload body: raw bytes, an open binary file or a path on disk.
+# Files and paths are streamed by httpx in chunks instead of being copied into memory.
+UploadBody = Union[bytes, BinaryIO, str, Path]
+
+# Errors worth retrying: the request never reached Postgres or the gateway was briefly unavailable
+_TRANSIENT_HTTP_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# PostgREST could not reach Postgres: the statement never ran, so even non-idempotent writes may be repeated
+_UNSENT_API_CODES = ('PGRST000', 'PGRST001', 'PGRST002')
+# Gateway statuses (APIError.code is the int status for non-JSON errors) can arrive after Postgres committed
+_TRANSIENT_API_CODES = (502, 503, 504) + _UNSENT_API_CODES
+
+def _is_transient_error(error: Exception, idempotent: bool = True) -> bool:
+    """
+    Checks whether a Supabase call failed for a temporary reason
+    
+    For non-idempotent calls only failures where the request never reached
+    Postgres count: a retry after a 502/504 could apply the write twice.
+    """
+    if isinstance(error, _TRANSIENT_HTTP_ERRORS):
+        return True
+    codes = _TRANSIENT_API_CODES if idempotent else _UNSENT_API_CODES
+    return isinstance(error, APIError) and error.code in codes
+
+def _with_retry(call, max_retries: int = 3, base_delay: float = 0.2, jitter: float = 0.25, idempotent: bool = True):
+    """
+    Выполняет запрос к Supabase с повтором при временных ошибках
+    
+    Экспоненциальная задержка с jitter; остальные исключения пробрасываются сразу.
+    
+    Args:
+        call: Функция без аргументов, обычно query.execute
+        max_retries: Максимальное число повторов
+        base_delay: Базовая задержка в секундах
+        jitter: Доля случайной добавки к задержке
+        idempotent: False для записей, которые нельзя повторять (инкременты, insert):
+            повтор только если запрос не дошёл до Postgres
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return call()
+        except Exception as e:
+            if attempt >= max_retries or not _is_transient_error(e, idempotent):
+                raise
+            delay = base_delay * 2 ** attempt * (1 + random.random() * jitter)
+            logger.warning("Временная ошибка Supabase (%s), повтор %s/%s через %.2fс", type(e).__name__, attempt + 1, max_retries, delay)
+            time.sleep(delay)
+
+def requires_client(default):
+    """
+    Returns `default` instead of calling the method when Supabase is not configured
+    
+    Replaces the per-method `if not self.is_connected(): return ...` preamble.
+    List/dict defaults are copied so callers never share a mutable fallback.
+    
+    Args:
+        default: Value returned when there is no client
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.client is None:
+                return copy.copy(default)
+            return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+def _file_size(path: str) -> Optional[int]:
+    """Size of a local file from a single stat() call, or None if it does not exist"""
+    try:
+        return os.stat(path).st_size
+    except FileNotFoundError:
+        return None
+
+def _thumbnail_suffix(path: str) -> str:
+    """Storage extension for a thumbnail file (previews are JPEG; PNG when unknown)"""
+    suffix = Path(path).suffix.lower()
+    return suffix if suffix in ('.jpg', '.jpeg', '.png') else '.png'
+
+@contextmanager
+def _upload_body(file_content: UploadBody):
+    """
+    Prepares an upload body for storage3 without buffering files in RAM
+    
+    Args:
+        file_content: Bytes, binary file object or path to a file
+        
+    Yields:
+        bytes or a binary file object that storage3/httpx can stream
+    """
+    if isinstance(file_content, (str, Path)):
+        with open(file_content, 'rb') as stream:
+            yield stream
+    elif isinstance(file_content, (bytes, BufferedReader, FileIO)):
+        yield file_content
+    else:
+        # Other file-likes (e.g. SpooledTemporaryFile) are not accepted by storage3 directly
+        yield file_content.read()
+
+
 def sanitize_search_query(query: str) -> str:
     """
     Sanitize search query to prevent SQL injection attacks.
@@ -64,28 +308,151 @@ def sanitize_search_query(query: str) -> str:
     
     return sanitized.strip()
 
+def escape_like_pattern(value: str) -> str:
+    """
+    Escape LIKE/ILIKE metacharacters so the value matches literally.
+    
+    sanitize_search_query keeps '_' (it is part of \\w), which ILIKE would
+    otherwise treat as a single-character wildcard.
+    
+    Args:
+        value: Already sanitized search text
+        
+    Returns:
+        Value with '\\', '%' and '_' escaped
+    """
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
 class SupabaseManager:
     """Class for managing Supabase connection"""
     
+    _instance = None
+    _instance_lock = threading.Lock()
+    
+    def __new__(cls):
+        # One manager per process: every SupabaseManager() shares the same clients and caches
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+        return cls._instance
+    
+    @classmethod
+    def get_instance(cls) -> 'SupabaseManager':
+        """Returns the process-wide SupabaseManager (created on first call)"""
+        return cls()
+    
     def __init__(self):
-        self.url = os.getenv('SUPABASE_URL')
-        self.key = os.getenv('SUPABASE_KEY')
-        self.service_role_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
-        self.client: Optional[Client] = None
-        
-        if self.url and self.key:
-            try:
-                self.client = create_client(self.url, self.key)
-                logger.info("Supabase client successfully initialized")
-            except Exception as e:
-                logger.error(f"Error initializing Supabase client: {e}")
-        else:
+        if getattr(self, '_initialized', False):
+            return
+        self._initialized = True
+        
+        env = _env()
+        self.url = env.url
+        self.key = env.key
+        self.service_role_key = env.service_role_key
+        
+        # Short-lived read caches for hot rows (game pages, "My games", community list).
+        # Cached values are never handed out directly: callers get shallow copies.
+        self._game_cache = TTLCache(maxsize=1024, ttl=30)
+        self._user_data_cache = TTLCache(maxsize=1024, ttl=30)
+        self._games_list_cache = TTLCache(maxsize=64, ttl=30)
+        # Nicknames rarely change and every write goes through set/delete_user_nickname, which invalidate
+        self._nickname_cache = TTLCache(maxsize=50_000, ttl=1800)
+        self._all_nicknames_cache = TTLCache(maxsize=1, ttl=60)
+        self._cache_lock = threading.Lock()
+    
+    @cached_property
+    def client(self) -> Optional[Client]:
+        """Anon-key client, created on first use (importing the module does no network setup)"""
+        if not (self.url and self.key):
             logger.warning("Supabase URL or key not configured")
+            return None
+        
+        try:
+            client = _PooledClient(self.url, self.key, options=self._client_options())
+            logger.info("Supabase client successfully initialized")
+            return client
+        except Exception as e:
+            logger.error("Error initializing Supabase client: %s", e)
+            return None
+    
+    @cached_property
+    def service_client(self) -> Optional[Client]:
+        """
+        Service-role client, created on first use and reused so its HTTP
+        connections stay pooled (keep-alive) across requests
+        """
+        if not (self.client and self.service_role_key):
+            return None
+        
+        try:
+            client = _PooledClient(self.url, self.service_role_key, options=self._client_options())
+            return client
+        except Exception as e:
+            logger.error("Error initializing Supabase service client: %s", e)
+            return None
+    
+    @staticmethod
+    def _client_options() -> ClientOptions:
+        """
+        Builds options for a Supabase client (a new object per client: supabase-py
+        writes the client's API key into options.headers)
+        
+        Returns:
+            ClientOptions with a bounded PostgREST timeout
+        """
+        return ClientOptions(postgrest_client_timeout=10, schema='public')
+    
+    def _invalidate_game_caches(self, user_id: str = None, game_id: str = None) -> None:
+        """
+        Drops cached entries affected by a write to user_data
+        
+        Args:
+            user_id: Owner whose data changed (optional)
+            game_id: Changed record ID (optional)
+        """
+        with self._cache_lock:
+            if user_id is not None:
+                self._user_data_cache.pop(str(user_id), None)
+            if game_id is not None:
+                self._game_cache.pop(str(game_id), None)
+            self._games_list_cache.clear()
+    
+    def _prime_game_cache(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        Stores freshly written html_game rows so a follow-up get_game_by_id needs no read
+        
+        Args:
+            rows: Rows returned by an INSERT/UPSERT with return=representation
+        """
+        with self._cache_lock:
+            for row in rows:
+                if row.get('id') is not None and row.get('data_type') == 'html_game':
+                    self._game_cache[str(row['id'])] = row
+    
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """
+        Runs a blocking manager call on the shared I/O pool
+        
+        Lets a request fire independent queries concurrently, e.g.
+        `liked = supabase_manager.submit(supabase_manager.get_user_liked_games, uid)`
+        followed later by `liked.result()`. Do not touch flask.session inside fn.
+        
+        Args:
+            fn: Callable to run (usually a SupabaseManager method)
+            *args, **kwargs: Arguments for fn
+            
+        Returns:
+            Future with the call result
+        """
+        return _io_executor.submit(fn, *args, **kwargs)
     
     def is_connected(self) -> bool:
         """Checks if client is connected to Supabase"""
         return self.client is not None
     
+    @requires_client(None)
     def get_current_user(self) -> Optional[Dict[str, Any]]:
         """
         Gets current authenticated user
@@ -93,16 +460,14 @@ class SupabaseManager:
         Returns:
             Dictionary with user data or None
         """
-        if not self.is_connected():
-            return None
-        
         try:
             user = self.client.auth.get_user()
             return user.user if user else None
         except Exception as e:
-            logger.error(f"Error getting current user: {e}")
+            logger.error("Error getting current user: %s", e)
             return None
     
+    @requires_client(None)
     def save_user_data(self, user_id: str, data_type: str, data_content: str, filename: str = None, title: str = None, description: str = None, thumbnail_url: str = None) -> Optional[Dict[str, Any]]:
         """
         Saves user data to Supabase
@@ -119,45 +484,34 @@ class SupabaseManager:
         Returns:
             Dictionary with saved record data or None on error
         """
-        if not self.is_connected():
-            return None
-        
         try:
+            # Optional fields are only sent when provided
             data = {
                 "user_id": user_id,
                 "data_type": data_type,
                 "data_content": data_content,
                 "filename": filename,
-                "created_at": "now()",
-                "updated_at": "now()"
+                **{k: v for k, v in (("title", title), ("description", description), ("thumbnail_url", thumbnail_url)) if v}
             }
             
-            # Add title, description, and thumbnail_url if provided
-            if title:
-                data["title"] = title
-            if description:
-                data["description"] = description
-            if thumbnail_url:
-                data["thumbnail_url"] = thumbnail_url
-            
             # Use service role key for server-side operations to bypass RLS
-            if self.service_role_key:
-                from supabase import create_client
-                service_client = create_client(self.url, self.service_role_key)
-                response = service_client.table('user_data').insert(data).execute()
-            else:
-                response = self.client.table('user_data').insert(data).execute()
+            client = self.service_client or self.client
+            # return=representation: the inserted row (id, timestamps) comes back in the same trip
+            response = client.table('user_data').insert(data, returning=ReturnMethod.representation).execute()
             
             if response.data:
-                logger.info(f"Данные пользователя {user_id} успешно сохранены")
-                return response.data[0]
+                logger.info("Данные пользователя %s успешно сохранены", user_id)
+                self._invalidate_game_caches(user_id=user_id)
+                self._prime_game_cache(response.data[:1])
+                return dict(response.data[0])
             
             return None
             
         except Exception as e:
-            logger.error(f"Ошибка при сохранении данных пользователя: {e}")
+            logger.error("Ошибка при сохранении данных пользователя: %s", e)
             return None
     
+    @requires_client([])
     def get_user_data(self, user_id: str) -> List[Dict[str, Any]]:
         """
         Получает все данные пользователя
@@ -166,25 +520,27 @@ class SupabaseManager:
             user_id: ID пользователя
             
         Returns:
-            Список словарей с данными пользователя
+            Список словарей с данными пользователя (без data_content, см. GAME_LIST_COLUMNS)
         """
-        if not self.is_connected():
-            return []
+        with self._cache_lock:
+            cached = self._user_data_cache.get(str(user_id))
+        if cached is not None:
+            return [dict(row) for row in cached]
         
         try:
             # Use service role key for server-side operations to bypass RLS
-            if self.service_role_key:
-                from supabase import create_client
-                service_client = create_client(self.url, self.service_role_key)
-                response = service_client.table('user_data').select('*').eq('user_id', user_id).order('created_at', desc=True).execute()
-            else:
-                response = self.client.table('user_data').select('*').eq('user_id', user_id).order('created_at', desc=True).execute()
+            client = self.service_client or self.client
+            response = client.table('user_data').select(GAME_LIST_COLUMNS).eq('user_id', user_id).order('created_at', desc=True).execute()
             
-            return response.data if response.data else []
+            rows = response.data if response.data else []
+            with self._cache_lock:
+                self._user_data_cache[str(user_id)] = rows
+            return [dict(row) for row in rows]
         except Exception as e:
-            logger.error(f"Ошибка при получении данных пользователя: {e}")
+            logger.error("Ошибка при получении данных пользователя: %s", e)
             return []
     
+    @requires_client(None)
     def get_user_data_by_id(self, data_id: str, user_id: str) -> Optional[Dict[str, Any]]:
         """
         Получает конкретную запись данных пользователя по ID
@@ -196,48 +552,103 @@ class SupabaseManager:
         Returns:
             Словарь с данными записи или None если не найдена
         """
-        if not self.is_connected():
-            return None
-        
         try:
             # Use service role key for server-side operations to bypass RLS
-            if self.service_role_key:
-                from supabase import create_client
-                service_client = create_client(self.url, self.service_role_key)
-                response = service_client.table('user_data').select('*').eq('id', data_id).eq('user_id', user_id).eq('data_type', 'html_game').execute()
-            else:
-                response = self.client.table('user_data').select('*').eq('id', data_id).eq('user_id', user_id).eq('data_type', 'html_game').execute()
+            client = self.service_client or self.client
+            response = client.table('user_data').select(USER_DATA_COLUMNS).eq('id', data_id).eq('user_id', user_id).eq('data_type', 'html_game').limit(1).execute()
             
             return response.data[0] if response.data else None
         except Exception as e:
-            logger.error(f"Ошибка при получении записи пользователя по ID: {e}")
+            logger.error("Ошибка при получении записи пользователя по ID: %s", e)
             return None
     
-    def get_all_uploaded_games(self) -> List[Dict[str, Any]]:
+    def get_all_uploaded_games(self, limit: int = 50, before: Optional[str] = None, offset: int = 0) -> Dict[str, Any]:
         """
-        Gets all uploaded HTML games from all users
+        Gets one page of uploaded HTML games from all users (newest first)
+        
+        Keyset pagination on (created_at, id): pass the returned next_cursor as
+        `before` to get the next page. The id tie-breaker keeps rows that share
+        a created_at from being skipped. Page-number UIs can use `offset`
+        instead (PostgREST range); keyset stays cheaper on deep pages. `offset`
+        is ignored when `before` is given, so the two are never mixed. Rows use GAME_LIST_COLUMNS and do not
+        include data_content; use get_game_content() or get_game_by_id() for a single game body.
+        
+        Args:
+            limit: Page size
+            before: next_cursor from the previous page (optional)
+            offset: Number of rows to skip, only without `before` (optional)
         
         Returns:
-            List of dictionaries with game data for all users
+            {'items': list of game dicts, 'next_cursor': cursor after the last row or None}
         """
+        empty = {'items': [], 'next_cursor': None}
         if not self.is_connected():
-            return []
-        
-        try:
+            return empty
+        
+        cursor = None
+        if before:
+            cursor = _GAMES_CURSOR_RE.fullmatch(before)
+            if cursor is None:
+                logger.warning("Invalid games cursor: %s", before)
+                return empty
+            offset = 0
+        
+        cache_key = (limit, before, offset)
+        with self._cache_lock:
+            cached = self._games_list_cache.get(cache_key)
+        if cached is None:
             # ALWAYS use service role key to bypass RLS for public community games access
-            if self.service_role_key:
-                from supabase import create_client
-                service_client = create_client(self.url, self.service_role_key)
-                response = service_client.table('user_data').select('*').eq('data_type', 'html_game').order('created_at', desc=True).execute()
-                return response.data if response.data else []
-            else:
+            if not self.service_client:
                 # If no service role key is configured, we cannot provide public access to all games
                 logger.error("Service role key not configured - cannot bypass RLS for public games access")
-                return []
+                return empty
+            try:
+                query = self.service_client.table('user_data').select(GAME_LIST_COLUMNS).eq('data_type', 'html_game')
+                if cursor:
+                    created_at, game_id = cursor.groups()
+                    # postgrest-py 0.13 has no or_(): add the PostgREST `or` parameter directly
+                    query.params = query.params.add('or', f'(created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{game_id}))')
+                # One `order` parameter with both keys (chained .order() calls would send two)
+                query.params = query.params.add('order', 'created_at.desc,id.desc')
+                response = query.range(offset, offset + limit - 1).execute()
+                cached = response.data if response.data else []
+                with self._cache_lock:
+                    self._games_list_cache[cache_key] = cached
+            except Exception as e:
+                logger.error("Error getting all uploaded games: %s", e)
+                return empty
+        
+        next_cursor = f"{cached[-1]['created_at']}|{cached[-1]['id']}" if len(cached) == limit else None
+        return {'items': [dict(row) for row in cached], 'next_cursor': next_cursor}
+    
+    @requires_client(None)
+    def get_game_content(self, game_id: str) -> Optional[str]:
+        """
+        Gets only the data_content (storage URL) of a game
+        
+        Args:
+            game_id: ID of the game
+            
+        Returns:
+            data_content value or None if not found
+        """
+        with self._cache_lock:
+            cached = self._game_cache.get(str(game_id))
+        if cached is not None:
+            return cached.get('data_content')
+        
+        if not self.service_client:
+            logger.error("Service role key not configured - cannot bypass RLS for public game access")
+            return None
+        
+        try:
+            response = self.service_client.table('user_data').select('data_content').eq('id', game_id).eq('data_type', 'html_game').limit(1).execute()
+            return response.data[0]['data_content'] if response.data else None
         except Exception as e:
-            logger.error(f"Error getting all uploaded games: {e}")
-            return []
+            logger.error("Error getting game content %s: %s", game_id, e)
+            return None
     
+    @requires_client(None)
     def get_game_by_id(self, game_id: str) -> Optional[Dict[str, Any]]:
         """
         Gets a specific game by its ID from any user
@@ -248,26 +659,70 @@ class SupabaseManager:
         Returns:
             Dictionary with game data or None if not found
         """
-        if not self.is_connected():
-            return None
+        with self._cache_lock:
+            cached = self._game_cache.get(str(game_id))
+        if cached is not None:
+            return dict(cached)
         
         try:
             # ALWAYS use service role key to bypass RLS for public game access
-            if self.service_role_key:
-                from supabase import create_client
-                service_client = create_client(self.url, self.service_role_key)
-                response = service_client.table('user_data').select('*').eq('id', game_id).eq('data_type', 'html_game').execute()
-                if response.data and len(response.data) > 0:
-                    return response.data[0]
+            if self.service_client:
+                response = self.service_client.table('user_data').select(USER_DATA_COLUMNS).eq('id', game_id).eq('data_type', 'html_game').limit(1).execute()
+                if response.data:
+                    with self._cache_lock:
+                        self._game_cache[str(game_id)] = response.data[0]
+                    return dict(response.data[0])
                 return None
             else:
                 # If no service role key is configured, we cannot provide public access to games
                 logger.error("Service role key not configured - cannot bypass RLS for public game access")
                 return None
         except Exception as e:
-            logger.error(f"Error getting game by ID {game_id}: {e}")
+            logger.error("Error getting game by ID %s: %s", game_id, e)
             return None
-    
+
+    def get_games_by_ids(self, game_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Gets several games in one round-trip (batched get_game_by_id)
+
+        Cached games are served from the cache, the rest are fetched with
+        a single `id IN (...)` query instead of one request per game.
+
+        Args:
+            game_ids: List of game IDs
+
+        Returns:
+            List of game dicts (None for missing games) in the order of game_ids
+        """
+        if not game_ids or not self.is_connected():
+            return [None] * len(game_ids or [])
+
+        keys = [str(game_id) for game_id in game_ids]
+        found = {}
+        with self._cache_lock:
+            for key in keys:
+                cached = self._game_cache.get(key)
+                if cached is not None:
+                    found[key] = cached
+
+        missing = list(dict.fromkeys(key for key in keys if key not in found))
+        if missing:
+            if not self.service_client:
+                logger.error("Service role key not configured - cannot bypass RLS for public game access")
+                return [None] * len(keys)
+            try:
+                response = self.service_client.table('user_data').select(USER_DATA_COLUMNS).in_('id', missing).eq('data_type', 'html_game').execute()
+                with self._cache_lock:
+                    for row in response.data or []:
+                        key = str(row['id'])
+                        self._game_cache[key] = row
+                        found[key] = row
+            except Exception as e:
+                logger.error("Error getting games by IDs %s: %s", missing, e)
+
+        return [dict(found[key]) if key in found else None for key in keys]
+
+    @requires_client(False)
     def delete_user_data(self, data_id: str, user_id: str) -> bool:
         """
         Удаляет данные пользователя и связанные файлы из storage
@@ -279,101 +734,64 @@ class SupabaseManager:
         Returns:
             True если удаление прошло успешно, False в противном случае
         """
-        if not self.is_connected():
-            return False
-        
         try:
-            # First, get the data record to extract file paths before deleting
-            game_data = None
-            if self.service_role_key:
-                from supabase import create_client
-                service_client = create_client(self.url, self.service_role_key)
-                response = service_client.table('user_data').select('*').eq('id', data_id).eq('user_id', user_id).execute()
-                if response.data:
-                    game_data = response.data[0]
-            else:
-                response = self.client.table('user_data').select('*').eq('id', data_id).eq('user_id', user_id).execute()
-                if response.data:
-                    game_data = response.data[0]
-            
-            if not game_data:
-                logger.warning(f"Game data {data_id} not found for user {user_id}")
+            # DELETE ... RETURNING: one round trip removes the row and yields its file URLs
+            client = self.service_client or self.client
+            delete_row = client.table('user_data').delete(returning=ReturnMethod.representation).eq('id', data_id).eq('user_id', user_id)
+            try:
+                response = delete_row.execute()
+            except APIError as e:
+                if e.code != '23503':
+                    raise
+                # game_likes references the row without ON DELETE CASCADE: clear likes first
+                client.table('game_likes').delete(returning=ReturnMethod.minimal).eq('game_id', data_id).execute()
+                response = delete_row.execute()
+            
+            if not response.data:
+                logger.warning("Game data %s not found for user %s", data_id, user_id)
                 return False
+            game_data = response.data[0]
+            self._invalidate_game_caches(user_id=user_id, game_id=data_id)
             
-            # Extract file paths from the data
+            # Extract file paths from the deleted row
             data_content = game_data.get('data_content')  # This contains the main file URL
             thumbnail_url = game_data.get('thumbnail_url')
             
-            logger.info(f"Game data URLs - data_content: {data_content}")
-            logger.info(f"Game data URLs - thumbnail_url: {thumbnail_url}")
-            
-            # Delete files from storage if they exist
-            files_deleted = []
+            logger.info("Game data URLs - data_content: %s", data_content)
+            logger.info("Game data URLs - thumbnail_url: %s", thumbnail_url)
             
-            # Delete main game file
-            if data_content and 'game-files/' in data_content:
-                try:
-                    # Extract file path from data_content URL
-                    # URL format: https://xxx.supabase.co/storage/v1/object/public/game-files/games/user_id/file_id.html
-                    if 'games/' in data_content:
-                        file_path = data_content.split('games/')[1]
-                        # Remove query parameters if present
-                        file_path = file_path.split('?')[0]
-                        if self.delete_file_from_storage('game-files', f"games/{file_path}"):
-                            files_deleted.append(f"Main file: games/{file_path}")
-                            logger.info(f"Deleted main game file: games/{file_path}")
-                        else:
-                            logger.warning(f"Failed to delete main game file: games/{file_path}")
-                except Exception as e:
-                    logger.error(f"Error deleting main game file: {e}")
+            # Collect storage paths of the main game file and thumbnail
+            storage_paths = []
+            game_match = _GAME_FILE_RE.search(data_content) if data_content else None
+            if game_match:
+                storage_paths.append(game_match.group(1))
+            thumbnail_match = _THUMBNAIL_RE.search(thumbnail_url) if thumbnail_url else None
+            if thumbnail_match:
+                storage_paths.append(thumbnail_match.group(1))
             
-            # Delete thumbnail file
-            if thumbnail_url and 'game-files/' in thumbnail_url:
-                try:
-                    # Extract file path from thumbnail URL
-                    # URL format: https://xxx.supabase.co/storage/v1/object/public/game-files/thumbnails/user_id/thumbnail_id.png
-                    if 'thumbnails/' in thumbnail_url:
-                        thumbnail_path = thumbnail_url.split('thumbnails/')[1]
-                        # Remove query parameters if present
-                        thumbnail_path = thumbnail_path.split('?')[0]
-                        if self.delete_file_from_storage('game-files', f"thumbnails/{thumbnail_path}"):
-                            files_deleted.append(f"Thumbnail: thumbnails/{thumbnail_path}")
-                            logger.info(f"Deleted thumbnail file: thumbnails/{thumbnail_path}")
-                        else:
-                            logger.warning(f"Failed to delete thumbnail file: thumbnails/{thumbnail_path}")
-                except Exception as e:
-                    logger.error(f"Error deleting thumbnail file: {e}")
+            # Storage cleanup and likes removal are independent: run them concurrently
+            storage_future = _io_executor.submit(self.delete_files_from_storage, 'game-files', storage_paths) if storage_paths else None
             
             # Delete related likes for this game
             try:
-                if self.service_role_key:
-                    from supabase import create_client
-                    service_client = create_client(self.url, self.service_role_key)
-                    likes_response = service_client.table('game_likes').delete().eq('game_id', data_id).execute()
-                else:
-                    likes_response = self.client.table('game_likes').delete().eq('game_id', data_id).execute()
-                
-                logger.info(f"Deleted likes for game {data_id}")
+                client.table('game_likes').delete(returning=ReturnMethod.minimal).eq('game_id', data_id).execute()
+                logger.info("Deleted likes for game %s", data_id)
             except Exception as e:
-                logger.warning(f"Failed to delete likes for game {data_id}: {e}")
-            
-            # Now delete the database record
-            if self.service_role_key:
-                from supabase import create_client
-                service_client = create_client(self.url, self.service_role_key)
-                response = service_client.table('user_data').delete().eq('id', data_id).eq('user_id', user_id).execute()
-            else:
-                response = self.client.table('user_data').delete().eq('id', data_id).eq('user_id', user_id).execute()
+                logger.warning("Failed to delete likes for game %s: %s", data_id, e)
             
-            logger.info(f"Game data {data_id} for user {user_id} successfully deleted from database")
-            if files_deleted:
-                logger.info(f"Files deleted from storage: {', '.join(files_deleted)}")
+            logger.info("Game data %s for user %s successfully deleted from database", data_id, user_id)
+            if storage_future is not None:
+                if storage_future.result():
+                    logger.info("Files deleted from storage: %s", ', '.join(storage_paths))
+                else:
+                    logger.warning("Failed to delete storage files: %s", ', '.join(storage_paths))
             
             return True
         except Exception as e:
-            logger.error(f"Error deleting user data: {e}")
+            logger.error("Error deleting user data: %s", e)
             return False
     
+    @requires_client(None)
     def update_user_data(self, data_id: str, user_id: str, data_content: str, filename: str = None) -> Optional[Dict[str, Any]]:
         """
         Обновляет данные пользователя
@@ -387,13 +805,9 @@ class SupabaseManager:
         Returns:
             Словарь с обновленными данными или None при ошибке
         """
-        if not self.is_connected():
-            return None
-        
         try:
             update_data = {
-                "data_content": data_content,
-                "updated_at": "now()"
+                "data_content": data_content
             }
             
             if filename:
@@ -402,51 +816,116 @@ class SupabaseManager:
             response = self.client.table('user_data').update(update_data).eq('id', data_id).eq('user_id', user_id).execute()
             
             if response.data:
-                logger.info(f"Данные {data_id} пользователя {user_id} успешно обновлены")
+                self._invalidate_game_caches(user_id=user_id, game_id=data_id)
+                logger.info("Данные %s пользователя %s успешно обновлены", data_id, user_id)
                 return response.data[0]
             
             return None
             
         except Exception as e:
-            logger.error(f"Ошибка при обновлении данных пользователя: {e}")
+            logger.error("Ошибка при обновлении данных пользователя: %s", e)
             return None
     
-    def upload_file_to_storage(self, bucket_name: str, file_path: str, file_content: bytes, content_type: str = None) -> Optional[str]:
+    @requires_client(None)
+    def upsert_user_data(self, user_id: str, data_type: str, data_content: str, filename: str, title: str = None, description: str = None, thumbnail_url: str = None, data_id: str = None) -> Optional[Dict[str, Any]]:
+        """
+        Сохраняет или обновляет данные пользователя
+        
+        Запись определяется по id: если data_id передан и принадлежит user_id,
+        строка обновляется одним UPDATE, иначе создается новая через INSERT.
+        Имя файла не является ключом, поэтому несколько записей могут иметь
+        одинаковый (или пустой) filename.
+        
+        Args:
+            user_id: ID пользователя
+            data_type: Тип данных
+            data_content: Содержимое данных
+            filename: Имя файла
+            title: Название игры (опционально)
+            description: Описание игры (опционально)
+            thumbnail_url: URL превью (опционально)
+            data_id: ID существующей записи для обновления (опционально)
+            
+        Returns:
+            Словарь с сохраненными данными или None при ошибке
+        """
+        try:
+            # Optional fields are only sent when provided
+            row = {
+                "user_id": user_id,
+                "data_type": data_type,
+                "data_content": data_content,
+                "filename": filename,
+                **{k: v for k, v in (("title", title), ("description", description), ("thumbnail_url", thumbnail_url)) if v}
+            }
+            
+            client = self.service_client or self.client
+            saved = None
+            if data_id:
+                # The user_id filter keeps the service-role client from touching another user's row
+                response = client.table('user_data').update(
+                    row,
+                    returning=ReturnMethod.representation
+                ).eq('id', data_id).eq('user_id', user_id).execute()
+                if response.data:
+                    saved = response.data[0]
+            
+            if saved is None:
+                response = client.table('user_data').insert(
+                    row,
+                    returning=ReturnMethod.representation
+                ).execute()
+                if response.data:
+                    saved = response.data[0]
+            
+            if saved:
+                self._invalidate_game_caches(user_id=user_id, game_id=saved.get('id'))
+                self._prime_game_cache([saved])
+                logger.info("Данные пользователя %s сохранены (upsert)", user_id)
+                return dict(saved)
+            
+            return None
+            
+        except Exception as e:
+            logger.error("Ошибка при upsert данных пользователя: %s", e)
+            return None
+    
+    @requires_client(None)
+    def upload_file_to_storage(self, bucket_name: str, file_path: str, file_content: UploadBody, content_type: str = None) -> Optional[str]:
         """
         Загружает файл в Supabase Storage
         
         Args:
             bucket_name: Имя bucket'а
             file_path: Путь к файлу в bucket'е
-            file_content: Содержимое файла в байтах
+            file_content: Содержимое файла (bytes, бинарный файл или путь к файлу)
             content_type: MIME тип файла
             
         Returns:
             URL загруженного файла или None при ошибке
         """
-        if not self.is_connected():
-            return None
-        
         try:
             # Загружаем файл в storage
-            response = self.client.storage.from_(bucket_name).upload(
-                path=file_path,
-                file=file_content,
-                file_options={"content-type": content_type} if content_type else None
-            )
+            with _upload_body(file_content) as body:
+                response = self.client.storage.from_(bucket_name).upload(
+                    path=file_path,
+                    file=body,
+                    file_options={"content-type": content_type} if content_type else None
+                )
             
             if response:
                 # Получаем публичный URL файла
                 public_url = self.client.storage.from_(bucket_name).get_public_url(file_path)
-                logger.info(f"Файл {file_path} успешно загружен в bucket {bucket_name}")
+                logger.info("Файл %s успешно загружен в bucket %s", file_path, bucket_name)
                 return public_url
             
             return None
             
         except Exception as e:
-            logger.error(f"Ошибка при загрузке файла в storage: {e}")
+            logger.error("Ошибка при загрузке файла в storage: %s", e)
             return None
     
+    @requires_client(False)
     def delete_file_from_storage(self, bucket_name: str, file_path: str) -> bool:
         """
         Удаляет файл из Supabase Storage
@@ -458,32 +937,53 @@ class SupabaseManager:
         Returns:
             True если удаление прошло успешно, False в противном случае
         """
-        if not self.is_connected():
-            return False
-        
         try:
             # Use service role key for server-side operations to bypass RLS
-            if self.service_role_key:
-                from supabase import create_client
-                service_client = create_client(self.url, self.service_role_key)
+            if self.service_client:
+                service_client = self.service_client
                 response = service_client.storage.from_(bucket_name).remove([file_path])
             else:
                 response = self.client.storage.from_(bucket_name).remove([file_path])
             
-            logger.info(f"Файл {file_path} успешно удален из bucket {bucket_name}")
+            logger.info("Файл %s успешно удален из bucket %s", file_path, bucket_name)
+            return True
+            
+        except Exception as e:
+            logger.error("Ошибка при удалении файла из storage: %s", e)
+            return False
+    
+    def delete_files_from_storage(self, bucket_name: str, file_paths: List[str]) -> bool:
+        """
+        Удаляет несколько файлов из Supabase Storage одним запросом
+        
+        Args:
+            bucket_name: Имя bucket'а
+            file_paths: Пути к файлам в bucket'е
+            
+        Returns:
+            True если удаление прошло успешно, False в противном случае
+        """
+        if not file_paths:
+            return True
+        
+        try:
+            client = self.service_client or self.client
+            client.storage.from_(bucket_name).remove(list(file_paths))
+            logger.info("Файлы %s успешно удалены из bucket %s", file_paths, bucket_name)
             return True
             
         except Exception as e:
-            logger.error(f"Ошибка при удалении файла из storage: {e}")
+            logger.error("Ошибка при удалении файлов из storage: %s", e)
             return False
     
-    def save_user_file(self, user_id: str, file_content: bytes, filename: str, content_type: str = None, title: str = None, description: str = None, thumbnail_path: str = None) -> Optional[Dict[str, Any]]:
+    @requires_client(None)
+    def save_user_file(self, user_id: str, file_content: UploadBody, filename: str, content_type: str = None, title: str = None, description: str = None, thumbnail_path: str = None) -> Optional[Dict[str, Any]]:
         """
         Сохраняет файл пользователя в storage и создает запись в user_data
         
         Args:
             user_id: ID пользователя
-            file_content: Содержимое файла в байтах
+            file_content: Содержимое файла (bytes, бинарный файл или путь к файлу)
             filename: Имя файла
             content_type: MIME тип файла
             title: Заголовок игры
@@ -493,16 +993,36 @@ class SupabaseManager:
         Returns:
             Словарь с данными сохраненного файла или None при ошибке
         """
-        if not self.is_connected():
-            return None
-        
         try:
             # Создаем уникальный путь для файла
-            import uuid
             file_id = str(uuid.uuid4())
-            file_extension = filename.split('.')[-1] if '.' in filename else 'html'
+            file_extension = os.path.splitext(filename)[1][1:] or 'html'
             storage_path = f"games/{user_id}/{file_id}.{file_extension}"
             
+            # Start the thumbnail upload first so it runs in parallel with the game file upload
+            uploaded_files = []
+            thumbnail_future = None
+            thumbnail_storage_path = None
+            file_size = _file_size(thumbnail_path) if thumbnail_path else None
+            if file_size is not None:
+                if file_size == 0:
+                    logger.error("Thumbnail file is empty: %s", thumbnail_path)
+                else:
+                    thumbnail_storage_path = f"thumbnails/{user_id}/{uuid.uuid4()}{_thumbnail_suffix(thumbnail_path)}"
+                    logger.info("Attempting to upload thumbnail: %s (%s bytes) to %s", thumbnail_path, file_size, thumbnail_storage_path)
+                    # Streamed from disk; no content type to avoid MIME type restrictions
+                    thumbnail_future = _io_executor.submit(
+                        self.upload_file_to_storage_with_service_role,
+                        bucket_name="game-files",
+                        file_path=thumbnail_storage_path,
+                        file_content=thumbnail_path,
+                        content_type=None
+                    )
+            elif thumbnail_path:
+                logger.warning("Thumbnail file does not exist: %s", thumbnail_path)
+            else:
+                logger.info("No thumbnail path provided")
+            
             # Загружаем файл в storage используя service role key для обхода RLS
             file_url = self.upload_file_to_storage_with_service_role(
                 bucket_name="game-files",
@@ -511,59 +1031,26 @@ class SupabaseManager:
                 content_type=content_type
             )
             
+            # Wait for the thumbnail before the temp file is removed in finally
+            thumbnail_url = None
+            if thumbnail_future is not None:
+                try:
+                    thumbnail_url = thumbnail_future.result()
+                except Exception as e:
+                    logger.error("Error uploading thumbnail: %s", e)
+                if thumbnail_url:
+                    logger.info("Thumbnail uploaded successfully: %s", thumbnail_url)
+                    uploaded_files.append(thumbnail_storage_path)
+                else:
+                    logger.warning("Failed to upload thumbnail, continuing without it")
+            
             if not file_url:
                 logger.error("Не удалось загрузить файл в storage")
+                self.delete_files_from_storage("game-files", uploaded_files)
                 return None
             
             # Track uploaded files for cleanup in case of failure
-            uploaded_files = [storage_path]
-            
-            # Upload thumbnail if provided
-            thumbnail_url = None
-            if thumbnail_path and os.path.exists(thumbnail_path):
-                try:
-                    # Validate thumbnail file
-                    file_size = os.path.getsize(thumbnail_path)
-                    if file_size == 0:
-                        logger.error(f"Thumbnail file is empty: {thumbnail_path}")
-                    else:
-                        # Create thumbnail path in storage
-                        thumbnail_id = str(uuid.uuid4())
-                        thumbnail_storage_path = f"thumbnails/{user_id}/{thumbnail_id}.png"
-                        
-                        logger.info(f"Attempting to upload thumbnail: {thumbnail_path}")
-                        logger.info(f"Thumbnail size: {file_size} bytes")
-                        logger.info(f"Storage path: {thumbnail_storage_path}")
-                        
-                        # Read thumbnail file
-                        with open(thumbnail_path, 'rb') as thumb_file:
-                            thumbnail_content = thumb_file.read()
-                        
-                        logger.info(f"Read thumbnail content: {len(thumbnail_content)} bytes")
-                        
-                        # Upload thumbnail to storage (without content type to avoid MIME type restrictions)
-                        thumbnail_url = self.upload_file_to_storage_with_service_role(
-                            bucket_name="game-files",
-                            file_path=thumbnail_storage_path,
-                            file_content=thumbnail_content,
-                            content_type=None  # Remove content type to avoid MIME type restrictions
-                        )
-                        
-                        if thumbnail_url:
-                            logger.info(f"Thumbnail uploaded successfully: {thumbnail_url}")
-                            uploaded_files.append(thumbnail_storage_path)
-                        else:
-                            logger.warning("Failed to upload thumbnail, continuing without it")
-                except Exception as e:
-                    logger.error(f"Error uploading thumbnail: {e}")
-                    import traceback
-                    logger.error(f"Full traceback: {traceback.format_exc()}")
-                    # Continue without thumbnail
-            else:
-                if thumbnail_path:
-                    logger.warning(f"Thumbnail file does not exist: {thumbnail_path}")
-                else:
-                    logger.info("No thumbnail path provided")
+            uploaded_files.append(storage_path)
             
             # Сохраняем информацию о файле в user_data
             result = self.save_user_data(
@@ -577,32 +1064,90 @@ class SupabaseManager:
             )
             
             if result:
-                logger.info(f"Файл {filename} пользователя {user_id} успешно сохранен")
+                logger.info("Файл %s пользователя %s успешно сохранен", filename, user_id)
                 return result
             
             return None
             
         except Exception as e:
-            logger.error(f"Ошибка при сохранении файла пользователя: {e}")
-            # Clean up uploaded files in case of failure
+            logger.error("Ошибка при сохранении файла пользователя: %s", e)
+            # Clean up uploaded files in case of failure (one storage request for all of them)
             if 'uploaded_files' in locals():
-                for file_path in uploaded_files:
-                    try:
-                        self.delete_file_from_storage("game-files", file_path)
-                        logger.info(f"Cleaned up failed upload: {file_path}")
-                    except Exception as cleanup_error:
-                        logger.warning(f"Failed to clean up file {file_path}: {cleanup_error}")
+                self.delete_files_from_storage("game-files", uploaded_files)
             return None
         finally:
             # Clean up thumbnail file if it was created locally
-            if thumbnail_path and os.path.exists(thumbnail_path):
+            if thumbnail_path:
                 try:
                     os.unlink(thumbnail_path)
-                    logger.info(f"Cleaned up temporary thumbnail file: {thumbnail_path}")
+                    logger.info("Cleaned up temporary thumbnail file: %s", thumbnail_path)
+                except FileNotFoundError:
+                    pass
                 except Exception as e:
-                    logger.warning(f"Failed to clean up thumbnail file: {e}")
+                    logger.warning("Failed to clean up thumbnail file: %s", e)
+    
+    def save_user_files_bulk(self, user_id: str, files: List[tuple]) -> List[Dict[str, Any]]:
+        """
+        Сохраняет несколько файлов пользователя: параллельная загрузка в storage
+        и одна вставка всех записей в user_data (вместо N запросов)
+        
+        Args:
+            user_id: ID пользователя
+            files: Список кортежей (file_content, filename, content_type)
+            
+        Returns:
+            Список сохраненных записей (пустой список при ошибке)
+        """
+        if not self.is_connected() or not files:
+            return []
+        
+        uploads = []
+        for file_content, filename, content_type in files:
+            file_extension = os.path.splitext(filename)[1][1:] or 'html'
+            storage_path = f"games/{user_id}/{uuid.uuid4()}.{file_extension}"
+            future = self.submit(
+                self.upload_file_to_storage_with_service_role,
+                bucket_name="game-files",
+                file_path=storage_path,
+                file_content=file_content,
+                content_type=content_type
+            )
+            uploads.append((storage_path, filename, future))
+        
+        uploaded_files = []
+        rows = []
+        try:
+            for storage_path, filename, future in uploads:
+                file_url = future.result()
+                if not file_url:
+                    raise RuntimeError(f"Не удалось загрузить файл {filename} в storage")
+                uploaded_files.append(storage_path)
+                rows.append({
+                    "user_id": user_id,
+                    "data_type": "html_game",
+                    "data_content": file_url,
+                    "filename": filename
+                })
+            
+            client = self.service_client or self.client
+            response = client.table('user_data').insert(rows, returning=ReturnMethod.representation).execute()
+            
+            self._invalidate_game_caches(user_id=user_id)
+            self._prime_game_cache(response.data or [])
+            logger.info("Сохранено файлов пользователя %s: %s", user_id, len(response.data or []))
+            return [dict(row) for row in response.data or []]
+            
+        except Exception as e:
+            logger.error("Ошибка при пакетном сохранении файлов пользователя: %s", e)
+            # Wait for in-flight uploads so none are left orphaned, then clean up
+            for storage_path, _, future in uploads:
+                if storage_path not in uploaded_files and future.result():
+                    uploaded_files.append(storage_path)
+            self.delete_files_from_storage("game-files", uploaded_files)
+            return []
     
-    def update_user_file(self, data_id: str, user_id: str, file_content: bytes, title: str = None, description: str = None, thumbnail_path: str = None) -> Optional[Dict[str, Any]]:
+    @requires_client(None)
+    def update_user_file(self, data_id: str, user_id: str, file_content: UploadBody, title: str = None, description: str = None, thumbnail_path: str = None) -> Optional[Dict[str, Any]]:
         """
         Обновляет существующий файл пользователя в storage и обновляет запись в user_data
         
@@ -617,21 +1162,17 @@ class SupabaseManager:
         Returns:
             Словарь с данными обновленного файла или None при ошибке
         """
-        if not self.is_connected():
-            return None
-        
         try:
             # Получаем текущую запись
             current_data = self.get_user_data_by_id(data_id, user_id)
             if not current_data:
-                logger.error(f"Record {data_id} not found for user {user_id}")
+                logger.error("Record %s not found for user %s", data_id, user_id)
                 return None
             
             # Создаем новый уникальный путь для файла
-            import uuid
             file_id = str(uuid.uuid4())
             filename = current_data.get('filename', 'game.html')
-            file_extension = filename.split('.')[-1] if '.' in filename else 'html'
+            file_extension = os.path.splitext(filename)[1][1:] or 'html'
             storage_path = f"games/{user_id}/{file_id}.{file_extension}"
             
             # Загружаем новый файл в storage
@@ -652,50 +1193,45 @@ class SupabaseManager:
             # Upload new thumbnail if provided
             thumbnail_url = current_data.get('thumbnail_url')  # Keep existing thumbnail by default
             thumbnail_storage_path = None
-            if thumbnail_path and os.path.exists(thumbnail_path):
+            file_size = _file_size(thumbnail_path) if thumbnail_path else None
+            if file_size is not None:
                 try:
                     # Validate thumbnail file
-                    file_size = os.path.getsize(thumbnail_path)
                     if file_size == 0:
-                        logger.error(f"Thumbnail file is empty: {thumbnail_path}")
+                        logger.error("Thumbnail file is empty: %s", thumbnail_path)
                     else:
                         # Create new thumbnail path in storage
                         thumbnail_id = str(uuid.uuid4())
-                        thumbnail_storage_path = f"thumbnails/{user_id}/{thumbnail_id}.png"
+                        thumbnail_storage_path = f"thumbnails/{user_id}/{thumbnail_id}{_thumbnail_suffix(thumbnail_path)}"
                         
-                        logger.info(f"Attempting to upload new thumbnail: {thumbnail_path}")
-                        logger.info(f"Thumbnail size: {file_size} bytes")
-                        logger.info(f"Storage path: {thumbnail_storage_path}")
+                        logger.info("Attempting to upload new thumbnail: %s", thumbnail_path)
+                        logger.info("Thumbnail size: %s bytes", file_size)
+                        logger.info("Storage path: %s", thumbnail_storage_path)
                         
-                        # Read thumbnail file
-                        with open(thumbnail_path, 'rb') as thumb_file:
-                            thumbnail_content = thumb_file.read()
-                        
-                        logger.info(f"Read thumbnail content: {len(thumbnail_content)} bytes")
-                        
-                        # Upload new thumbnail to storage
+                        # Upload new thumbnail to storage, streamed from disk
                         thumbnail_url = self.upload_file_to_storage_with_service_role(
                             bucket_name="game-files",
                             file_path=thumbnail_storage_path,
-                            file_content=thumbnail_content,
+                            file_content=thumbnail_path,
                             content_type=None
                         )
                         
                         if thumbnail_url:
-                            logger.info(f"New thumbnail uploaded successfully: {thumbnail_url}")
+                            logger.info("New thumbnail uploaded successfully: %s", thumbnail_url)
                             uploaded_files.append(thumbnail_storage_path)
                         else:
                             logger.warning("Failed to upload new thumbnail, keeping existing one")
                             thumbnail_url = current_data.get('thumbnail_url')
+                            thumbnail_storage_path = None
                 except Exception as e:
-                    logger.error(f"Error uploading new thumbnail: {e}")
+                    logger.error("Error uploading new thumbnail: %s", e)
                     # Keep existing thumbnail
                     thumbnail_url = current_data.get('thumbnail_url')
+                    thumbnail_storage_path = None
             
             # Обновляем запись в user_data
             update_data = {
-                'data_content': file_url,
-                'updated_at': datetime.now().isoformat()
+                'data_content': file_url
             }
             
             if title is not None:
@@ -706,133 +1242,113 @@ class SupabaseManager:
                 update_data['thumbnail_url'] = thumbnail_url
             
             # Use service role key for server-side operations to bypass RLS
-            if self.service_role_key:
-                from supabase import create_client
-                service_client = create_client(self.url, self.service_role_key)
+            if self.service_client:
+                service_client = self.service_client
                 result = service_client.table('user_data').update(update_data).eq('id', data_id).eq('user_id', user_id).eq('data_type', 'html_game').execute()
             else:
                 result = self.client.table('user_data').update(update_data).eq('id', data_id).eq('user_id', user_id).eq('data_type', 'html_game').execute()
             
-            if result.data and len(result.data) > 0:
-                logger.info(f"Файл {data_id} пользователя {user_id} успешно обновлен")
+            if result.data:
+                logger.info("Файл %s пользователя %s успешно обновлен", data_id, user_id)
+                self._invalidate_game_caches(user_id=user_id, game_id=data_id)
+                self._prime_game_cache(result.data[:1])
                 
                 # Clean up old files from storage after successful database update
                 # This ensures we only delete old files if the new ones were successfully uploaded and DB updated
                 old_file_url = current_data.get('data_content')
                 old_thumbnail_url = current_data.get('thumbnail_url')
                 
-                # Delete old main game file
-                if old_file_url and 'game-files/' in old_file_url:
-                    try:
-                        # Extract file path from old file URL
-                        # URL format: https://xxx.supabase.co/storage/v1/object/public/game-files/games/user_id/file_id.html
-                        if 'games/' in old_file_url:
-                            old_file_path = old_file_url.split('games/')[1]
-                            # Remove query parameters if present
-                            old_file_path = old_file_path.split('?')[0]
-                            if self.delete_file_from_storage('game-files', f"games/{old_file_path}"):
-                                logger.info(f"Deleted old game file: games/{old_file_path}")
-                            else:
-                                logger.warning(f"Failed to delete old game file: games/{old_file_path}")
-                    except Exception as e:
-                        logger.error(f"Error deleting old game file: {e}")
+                old_paths = []
+                old_file_match = _GAME_FILE_RE.search(old_file_url) if old_file_url else None
+                if old_file_match:
+                    old_paths.append(old_file_match.group(1))
+                # Delete old thumbnail file only if we uploaded a new one
+                old_thumbnail_match = _THUMBNAIL_RE.search(old_thumbnail_url) if thumbnail_storage_path and old_thumbnail_url else None
+                if old_thumbnail_match:
+                    old_paths.append(old_thumbnail_match.group(1))
                 
-                # Delete old thumbnail file (only if we uploaded a new one)
-                if thumbnail_storage_path and old_thumbnail_url and 'game-files/' in old_thumbnail_url:
-                    try:
-                        # Extract file path from old thumbnail URL
-                        # URL format: https://xxx.supabase.co/storage/v1/object/public/game-files/thumbnails/user_id/thumbnail_id.png
-                        if 'thumbnails/' in old_thumbnail_url:
-                            old_thumbnail_path = old_thumbnail_url.split('thumbnails/')[1]
-                            # Remove query parameters if present
-                            old_thumbnail_path = old_thumbnail_path.split('?')[0]
-                            if self.delete_file_from_storage('game-files', f"thumbnails/{old_thumbnail_path}"):
-                                logger.info(f"Deleted old thumbnail file: thumbnails/{old_thumbnail_path}")
-                            else:
-                                logger.warning(f"Failed to delete old thumbnail file: thumbnails/{old_thumbnail_path}")
-                    except Exception as e:
-                        logger.error(f"Error deleting old thumbnail file: {e}")
+                # Fire-and-forget: the response does not depend on the cleanup (it logs its own outcome)
+                if old_paths:
+                    _io_executor.submit(self.delete_files_from_storage, 'game-files', old_paths)
                 
-                return result.data[0]
+                return dict(result.data[0])
             else:
-                logger.error(f"Не удалось обновить запись {data_id} - no data returned")
-                logger.error(f"Update result: {result}")
+                logger.error("Не удалось обновить запись %s - no data returned", data_id)
+                logger.error("Update result: %s", result)
                 return None
             
         except Exception as e:
-            logger.error(f"Ошибка при обновлении файла пользователя: {e}")
-            # Clean up uploaded files in case of failure
+            logger.error("Ошибка при обновлении файла пользователя: %s", e)
+            # Clean up uploaded files in case of failure (one storage request for all of them)
             if 'uploaded_files' in locals():
-                for file_path in uploaded_files:
-                    try:
-                        self.delete_file_from_storage("game-files", file_path)
-                        logger.info(f"Cleaned up failed upload: {file_path}")
-                    except Exception as cleanup_error:
-                        logger.warning(f"Failed to clean up file {file_path}: {cleanup_error}")
+                self.delete_files_from_storage("game-files", uploaded_files)
             return None
         finally:
             # Clean up thumbnail file if it was created locally
-            if thumbnail_path and os.path.exists(thumbnail_path):
+            if thumbnail_path:
                 try:
                     os.unlink(thumbnail_path)
-                    logger.info(f"Cleaned up temporary thumbnail file: {thumbnail_path}")
+                    logger.info("Cleaned up temporary thumbnail file: %s", thumbnail_path)
+                except FileNotFoundError:
+                    pass
                 except Exception as e:
-                    logger.warning(f"Failed to clean up thumbnail file: {e}")
+                    logger.warning("Failed to clean up thumbnail file: %s", e)
     
-    def upload_file_to_storage_with_service_role(self, bucket_name: str, file_path: str, file_content: bytes, content_type: str = None) -> Optional[str]:
+    def upload_file_to_storage_with_service_role(self, bucket_name: str, file_path: str, file_content: UploadBody, content_type: str = None) -> Optional[str]:
         """
         Загружает файл в Supabase Storage используя service role key
         
         Args:
             bucket_name: Имя bucket'а
             file_path: Путь к файлу в bucket'е
-            file_content: Содержимое файла в байтах
+            file_content: Содержимое файла (bytes, бинарный файл или путь к файлу)
             content_type: MIME тип файла
             
         Returns:
             URL загруженного файла или None при ошибке
         """
-        if not self.service_role_key:
+        if not self.service_client:
             logger.error("Service role key not configured")
             return None
         
         try:
-            logger.info(f"Creating service client for bucket: {bucket_name}")
-            # Создаем клиент с service role key для обхода RLS
-            from supabase import create_client
-            service_client = create_client(self.url, self.service_role_key)
+            # Используем общий клиент с service role key для обхода RLS
+            service_client = self.service_client
             
-            logger.info(f"Attempting to upload file to {bucket_name}/{file_path}")
-            logger.info(f"File content size: {len(file_content)} bytes")
-            logger.info(f"Content type: {content_type}")
+            logger.info("Attempting to upload file to %s/%s", bucket_name, file_path)
+            if isinstance(file_content, bytes):
+                logger.info("File content size: %s bytes", len(file_content))
+            logger.info("Content type: %s", content_type)
             
             # Загружаем файл в storage
-            response = service_client.storage.from_(bucket_name).upload(
-                path=file_path,
-                file=file_content,
-                file_options={"content-type": content_type} if content_type else None
-            )
+            with _upload_body(file_content) as body:
+                response = service_client.storage.from_(bucket_name).upload(
+                    path=file_path,
+                    file=body,
+                    file_options={"content-type": content_type} if content_type else None
+                )
             
-            logger.info(f"Upload response: {response}")
+            logger.info("Upload response: %s", response)
             
             if response:
                 # Получаем публичный URL файла
                 public_url = service_client.storage.from_(bucket_name).get_public_url(file_path)
-                logger.info(f"Файл {file_path} успешно загружен в bucket {bucket_name}")
-                logger.info(f"Public URL: {public_url}")
+                logger.info("Файл %s успешно загружен в bucket %s", file_path, bucket_name)
+                logger.info("Public URL: %s", public_url)
                 return public_url
             else:
                 logger.error("Upload response was empty or None")
                 return None
             
         except Exception as e:
-            logger.error(f"Ошибка при загрузке файла в storage: {e}")
+            logger.error("Ошибка при загрузке файла в storage: %s", e)
             import traceback
-            logger.error(f"Full traceback: {traceback.format_exc()}")
+            logger.error("Full traceback: %s", traceback.format_exc())
             return None
 
     # ============ LIKES SYSTEM METHODS ============
     
+    @requires_client(False)
     def like_game(self, game_id: str, user_id: str) -> bool:
         """
         Likes a game for a user
@@ -844,23 +1360,19 @@ class SupabaseManager:
         Returns:
             True if successful, False otherwise
         """
-        if not self.is_connected():
-            return False
-        
         try:
             # Use service role key to bypass RLS for likes operations
-            if self.service_role_key:
-                from supabase import create_client
-                service_client = create_client(self.url, self.service_role_key)
+            if self.service_client:
+                service_client = self.service_client
                 
                 # Insert like record
-                response = service_client.table('game_likes').insert({
+                response = _with_retry(service_client.table('game_likes').insert({
                     'game_id': game_id,
                     'user_id': user_id
-                }).execute()
+                }).execute, idempotent=False)
                 
                 if response.data:
-                    logger.info(f"User {user_id} liked game {game_id}")
+                    logger.info("User %s liked game %s", user_id, game_id)
                     return True
                     
             return False
@@ -868,12 +1380,13 @@ class SupabaseManager:
         except Exception as e:
             # Handle duplicate like (user already liked this game)
             if 'unique constraint' in str(e).lower() or 'duplicate key' in str(e).lower():
-                logger.info(f"User {user_id} already liked game {game_id}")
+                logger.info("User %s already liked game %s", user_id, game_id)
                 return True  # Consider it successful since the desired state is achieved
             
-            logger.error(f"Error liking game {game_id} for user {user_id}: {e}")
+            logger.error("Error liking game %s for user %s: %s", game_id, user_id, e)
             return False
     
+    @requires_client(False)
     def unlike_game(self, game_id: str, user_id: str) -> bool:
         """
         Unlikes a game for a user
@@ -885,27 +1398,24 @@ class SupabaseManager:
         Returns:
             True if successful, False otherwise
         """
-        if not self.is_connected():
-            return False
-        
         try:
             # Use service role key to bypass RLS for likes operations
-            if self.service_role_key:
-                from supabase import create_client
-                service_client = create_client(self.url, self.service_role_key)
+            if self.service_client:
+                service_client = self.service_client
                 
                 # Delete like record
                 response = service_client.table('game_likes').delete().eq('game_id', game_id).eq('user_id', user_id).execute()
                 
-                logger.info(f"User {user_id} unliked game {game_id}")
+                logger.info("User %s unliked game %s", user_id, game_id)
                 return True
                     
             return False
             
         except Exception as e:
-            logger.error(f"Error unliking game {game_id} for user {user_id}: {e}")
+            logger.error("Error unliking game %s for user %s: %s", game_id, user_id, e)
             return False
     
+    @requires_client([])
     def get_user_liked_games(self, user_id: str) -> List[str]:
         """
         Gets list of game IDs that a user has liked
@@ -916,14 +1426,10 @@ class SupabaseManager:
         Returns:
             List of game IDs that the user has liked
         """
-        if not self.is_connected():
-            return []
-        
         try:
             # Use service role key to bypass RLS
-            if self.service_role_key:
-                from supabase import create_client
-                service_client = create_client(self.url, self.service_role_key)
+            if self.service_client:
+                service_client = self.service_client
                 
                 response = service_client.table('game_likes').select('game_id').eq('user_id', user_id).execute()
                 
@@ -933,9 +1439,10 @@ class SupabaseManager:
             return []
             
         except Exception as e:
-            logger.warning(f"Likes table not available, returning empty likes list: {e}")
+            logger.warning("Likes table not available, returning empty likes list: %s", e)
             return []  # Return empty list if likes table doesn't exist
     
+    @requires_client(False)
     def is_game_liked_by_user(self, game_id: str, user_id: str) -> bool:
         """
         Checks if a specific game is liked by a user
@@ -947,25 +1454,94 @@ class SupabaseManager:
         Returns:
             True if user has liked the game, False otherwise
         """
-        if not self.is_connected():
-            return False
-        
         try:
             # Use service role key to bypass RLS
-            if self.service_role_key:
-                from supabase import create_client
-                service_client = create_client(self.url, self.service_role_key)
+            if self.service_client:
+                service_client = self.service_client
                 
-                response = service_client.table('game_likes').select('id').eq('game_id', game_id).eq('user_id', user_id).execute()
+                # EXISTS-style check: at most one tiny row comes back
+                response = service_client.table('game_likes').select('game_id').eq('game_id', game_id).eq('user_id', user_id).limit(1).execute()
                 
-                return len(response.data or []) > 0
+                return bool(response.data)
                     
             return False
             
         except Exception as e:
-            logger.error(f"Error checking if game {game_id} is liked by user {user_id}: {e}")
+            logger.error("Error checking if game %s is liked by user %s: %s", game_id, user_id, e)
             return False
     
+    @requires_client(set())
+    def get_liked_game_ids_in(self, user_id: str, game_ids: List[str]) -> set:
+        """
+        Checks which of the given games a user has liked, in one query
+        
+        Use instead of calling is_game_liked_by_user per game when rendering a list.
+        
+        Args:
+            user_id: ID of the user
+            game_ids: IDs of the games on the page
+            
+        Returns:
+            Set of liked game IDs (subset of game_ids)
+        """
+        if not game_ids or not self.service_client:
+            return set()
+        
+        try:
+            response = self.service_client.table('game_likes').select('game_id').eq('user_id', user_id).in_('game_id', list(game_ids)).execute()
+            return {row['game_id'] for row in response.data or []}
+            
+        except Exception as e:
+            logger.error("Error checking liked games for user %s: %s", user_id, e)
+            return set()
+    
+    @staticmethod
+    def _flatten_stats_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Replaces the nested game_statistics join (dict, list or None) on each
+        row with flat likes_count/plays_count fields, in place
+        
+        Args:
+            rows: user_data rows selected with game_statistics(likes_count, plays_count, ...)
+            
+        Returns:
+            The same list, with likes_count/plays_count set (0 when no statistics row)
+        """
+        get = dict.get
+        for game in rows:
+            stats = game.pop('game_statistics', None)
+            if isinstance(stats, list):
+                stats = stats[0] if stats else None
+            if stats:
+                game['likes_count'] = get(stats, 'likes_count', 0)
+                game['plays_count'] = get(stats, 'plays_count', 0)
+            else:
+                game['likes_count'] = game['plays_count'] = 0
+        return rows
+    
+    def _query_games_with_stats_view(self, client, limit: int = None, order_by: str = 'created_at', title_query: str = None, with_nickname: bool = False) -> List[Dict[str, Any]]:
+        """
+        Reads games from the games_with_stats view (games_with_stats_view.sql)
+        
+        Ordering by likes/plays and the limit are applied by Postgres, so only
+        the requested page is transferred.
+        
+        Raises:
+            APIError: code in _MISSING_RELATION_CODES if the view is not installed,
+                _UNDEFINED_COLUMN_CODE if with_nickname is set on an older view
+        """
+        columns = f'{GAME_LIST_COLUMNS},likes_count,plays_count'
+        if with_nickname:
+            columns += ',user_nickname'
+        query = client.table('games_with_stats').select(columns)
+        if title_query:
+            query = query.ilike('title', f'%{escape_like_pattern(title_query)}%')
+        query = query.order(order_by if order_by in _GAME_SORT_FIELDS else 'created_at', desc=True)
+        if limit:
+            query = query.limit(limit)
+        return query.execute().data or []
+    
+    @requires_client([])
     def get_games_with_stats(self, limit: int = None, order_by: str = 'created_at') -> List[Dict[str, Any]]:
         """
         Gets all uploaded HTML games with their statistics (likes, plays)
@@ -978,83 +1554,57 @@ class SupabaseManager:
         Returns:
             List of dictionaries with game data and statistics
         """
-        if not self.is_connected():
-            return []
-        
         try:
             # Use service role key to bypass RLS
-            if self.service_role_key:
-                from supabase import create_client
-                service_client = create_client(self.url, self.service_role_key)
+            if self.service_client:
+                service_client = self.service_client
+                
+                try:
+                    return self._query_games_with_stats_view(service_client, limit, order_by)
+                except APIError as e:
+                    if e.code not in _MISSING_RELATION_CODES:
+                        raise
+                    logger.warning("games_with_stats view not installed, using join + client-side sort")
                 
                 try:
                     # Try to query games with statistics join
                     query = service_client.table('user_data').select(
-                        '*, game_statistics(likes_count, plays_count, updated_at)'
+                        f'{GAME_LIST_COLUMNS}, game_statistics(likes_count, plays_count, updated_at)'
                     ).eq('data_type', 'html_game')
                     
-                    # Apply ordering - Supabase doesn't support ordering by joined table fields directly
-                    # We'll do client-side sorting after getting the data
+                    # Supabase can't order by joined fields: created_at order and LIMIT run in the DB,
+                    # stats orderings are sorted and sliced client-side (LIMIT first would pick the wrong rows)
                     query = query.order('created_at', desc=True)
-                    
-                    # Apply limit if specified
-                    if limit:
+                    sort_by_stats = order_by in ('likes_count', 'plays_count')
+                    if limit and not sort_by_stats:
                         query = query.limit(limit)
                     
                     response = query.execute()
                     
                     if response.data:
-                        # Process the data to flatten statistics
-                        games = []
-                        for game in response.data:
-                            stats = game.get('game_statistics')
-                            if stats and isinstance(stats, dict):
-                                # Single statistics record as dictionary
-                                game['likes_count'] = stats.get('likes_count', 0)
-                                game['plays_count'] = stats.get('plays_count', 0)
-                            elif stats and isinstance(stats, list) and len(stats) > 0:
-                                # Multiple statistics records as list (take first)
-                                stat = stats[0]
-                                game['likes_count'] = stat.get('likes_count', 0)
-                                game['plays_count'] = stat.get('plays_count', 0)
-                            else:
-                                # No statistics record yet, initialize with defaults
-                                game['likes_count'] = 0
-                                game['plays_count'] = 0
-                            
-                            # Remove the nested statistics object
-                            if 'game_statistics' in game:
-                                del game['game_statistics']
-                            
-                            games.append(game)
-                        
-                        # Apply client-side sorting based on order_by parameter
-                        if order_by == 'likes_count':
-                            games.sort(key=lambda x: x.get('likes_count', 0), reverse=True)
-                        elif order_by == 'plays_count':
-                            games.sort(key=lambda x: x.get('plays_count', 0), reverse=True)
-                        # created_at is already sorted by the query
+                        games = self._flatten_stats_rows(response.data)
                         
-                        # Apply limit after sorting
-                        if limit:
-                            games = games[:limit]
+                        if sort_by_stats:
+                            games.sort(key=itemgetter(order_by), reverse=True)
+                            if limit:
+                                games = games[:limit]
                         
                         return games
                         
                 except Exception as stats_error:
-                    logger.warning(f"Statistics table not available, falling back to basic games: {stats_error}")
+                    logger.warning("Statistics table not available, falling back to basic games: %s", stats_error)
                     # Fall back to basic game query without statistics
                     return self._get_games_fallback(service_client, limit, order_by)
                     
             return []
             
         except Exception as e:
-            logger.error(f"Error getting games with statistics: {e}")
+            logger.error("Error getting games with statistics: %s", e)
             # Try fallback with regular client if service role fails
             try:
                 return self._get_games_fallback(self.client, limit, order_by)
             except Exception as fallback_error:
-                logger.error(f"Fallback also failed: {fallback_error}")
+                logger.error("Fallback also failed: %s", fallback_error)
                 return []
     
     def _get_games_fallback(self, client, limit: int = None, order_by: str = 'created_at') -> List[Dict[str, Any]]:
@@ -1063,41 +1613,31 @@ class SupabaseManager:
         """
         try:
             # Query basic games data
-            query = client.table('user_data').select('*').eq('data_type', 'html_game')
+            query = client.table('user_data').select(GAME_LIST_COLUMNS).eq('data_type', 'html_game')
             
-            # Always order by created_at first, then we'll sort client-side
+            # Counts are all 0 here, so created_at order and LIMIT can run in the DB
             query = query.order('created_at', desc=True)
+            if limit:
+                query = query.limit(limit)
             
-            # Don't apply limit here - we need to sort first, then limit
             response = query.execute()
             
             if response.data:
-                # Add default statistics to games
-                games = []
-                for game in response.data:
-                    game['likes_count'] = 0  # Default values when no stats table
+                # Add default statistics to games (no stats table: every count is 0,
+                # so likes/plays orderings keep the created_at order from the query)
+                games = response.data
+                for game in games:
+                    game['likes_count'] = 0
                     game['plays_count'] = 0
-                    games.append(game)
-                
-                # Apply client-side sorting based on order_by parameter
-                if order_by == 'likes_count':
-                    games.sort(key=lambda x: x.get('likes_count', 0), reverse=True)
-                elif order_by == 'plays_count':
-                    games.sort(key=lambda x: x.get('plays_count', 0), reverse=True)
-                # created_at is already sorted by the query
-                
-                # Apply limit after sorting
-                if limit:
-                    games = games[:limit]
-                
                 return games
                 
             return []
             
         except Exception as e:
-            logger.error(f"Fallback method failed: {e}")
+            logger.error("Fallback method failed: %s", e)
             return []
     
+    @requires_client(False)
     def increment_game_play_count(self, game_id: str) -> bool:
         """
         Increments the play count for a game
@@ -1108,44 +1648,49 @@ class SupabaseManager:
         Returns:
             True if successful, False otherwise
         """
-        if not self.is_connected():
-            return False
-        
         try:
             # Use service role key to bypass RLS
-            if self.service_role_key:
-                from supabase import create_client
-                service_client = create_client(self.url, self.service_role_key)
-                
-                # Try to update existing record
-                existing = service_client.table('game_statistics').select('*').eq('game_id', game_id).execute()
+            if self.service_client:
+                service_client = self.service_client
                 
-                if existing.data and len(existing.data) > 0:
-                    # Update existing record
-                    new_count = existing.data[0]['plays_count'] + 1
-                    service_client.table('game_statistics').update({
-                        'plays_count': new_count,
-                        'updated_at': 'now()'
-                    }).eq('game_id', game_id).execute()
-                else:
-                    # Create new record
-                    service_client.table('game_statistics').insert({
-                        'game_id': game_id,
-                        'likes_count': 0,
-                        'plays_count': 1
-                    }).execute()
+                try:
+                    # Atomic upsert-increment in Postgres (increment_play_count_function.sql)
+                    _with_retry(service_client.rpc('increment_play_count', {'p_game_id': game_id}).execute, idempotent=False)
+                except APIError as e:
+                    if e.code not in _MISSING_FUNCTION_CODES:
+                        raise
+                    logger.warning("increment_play_count RPC not installed, using read-modify-write")
+                    self._increment_game_play_count_fallback(service_client, game_id)
                 
-                logger.info(f"Incremented play count for game {game_id}")
+                logger.info("Incremented play count for game %s", game_id)
                 return True
                     
             return False
             
         except Exception as e:
-            logger.error(f"Error incrementing play count for game {game_id}: {e}")
+            logger.error("Error incrementing play count for game %s: %s", game_id, e)
             return False
+    
+    def _increment_game_play_count_fallback(self, client, game_id: str) -> None:
+        """
+        Fallback for databases without the increment_play_count function (not atomic)
+        """
+        existing = client.table('game_statistics').select('plays_count').eq('game_id', game_id).limit(1).execute()
+        
+        if existing.data:
+            client.table('game_statistics').update({
+                'plays_count': existing.data[0]['plays_count'] + 1
+            }).eq('game_id', game_id).execute()
+        else:
+            client.table('game_statistics').insert({
+                'game_id': game_id,
+                'likes_count': 0,
+                'plays_count': 1
+            }).execute()
 
     # ============ CREDITS SYSTEM METHODS ============
     
+    @requires_client(0)
     def get_user_credits(self, user_id: str) -> int:
         """
         Gets the current credits for a user
@@ -1156,30 +1701,27 @@ class SupabaseManager:
         Returns:
             Number of credits the user has, 0 if not found
         """
-        if not self.is_connected():
-            return 0
-        
         try:
             # Use service role key to bypass RLS
-            if self.service_role_key:
-                from supabase import create_client
-                service_client = create_client(self.url, self.service_role_key)
+            if self.service_client:
+                service_client = self.service_client
                 
                 response = service_client.table('user_credits').select('credits').eq('user_id', user_id).execute()
                 
-                if response.data and len(response.data) > 0:
+                if response.data:
                     return response.data[0]['credits']
                 else:
                     # User doesn't have credits record yet, create one with 2 credits
-                    logger.info(f"User {user_id} doesn't have credits record, creating one with 2 credits")
+                    logger.info("User %s doesn't have credits record, creating one with 2 credits", user_id)
                     return self.create_user_credits_record(user_id, 2)
                     
             return 0
             
         except Exception as e:
-            logger.error(f"Error getting credits for user {user_id}: {e}")
+            logger.error("Error getting credits for user %s: %s", user_id, e)
             return 0
     
+    @requires_client(0)
     def create_user_credits_record(self, user_id: str, initial_credits: int = 2) -> int:
         """
         Creates a credits record for a user
@@ -1191,30 +1733,27 @@ class SupabaseManager:
         Returns:
             Number of credits created, 0 if failed
         """
-        if not self.is_connected():
-            return 0
-        
         try:
             # Use service role key to bypass RLS
-            if self.service_role_key:
-                from supabase import create_client
-                service_client = create_client(self.url, self.service_role_key)
+            if self.service_client:
+                service_client = self.service_client
                 
                 response = service_client.table('user_credits').insert({
                     'user_id': user_id,
                     'credits': initial_credits
                 }).execute()
                 
-                if response.data and len(response.data) > 0:
-                    logger.info(f"Created credits record for user {user_id} with {initial_credits} credits")
+                if response.data:
+                    logger.info("Created credits record for user %s with %s credits", user_id, initial_credits)
                     return response.data[0]['credits']
                     
             return 0
             
         except Exception as e:
-            logger.error(f"Error creating credits record for user {user_id}: {e}")
+            logger.error("Error creating credits record for user %s: %s", user_id, e)
             return 0
     
+    @requires_client(False)
     def update_user_credits(self, user_id: str, new_credits: int) -> bool:
         """
         Updates the credits for a user
@@ -1226,34 +1765,47 @@ class SupabaseManager:
         Returns:
             True if successful, False otherwise
         """
-        if not self.is_connected():
-            return False
-        
         try:
             # Use service role key to bypass RLS
-            if self.service_role_key:
-                from supabase import create_client
-                service_client = create_client(self.url, self.service_role_key)
+            if self.service_client:
+                service_client = self.service_client
                 
-                response = service_client.table('user_credits').update({
-                    'credits': new_credits,
-                    'updated_at': 'now()'
-                }).eq('user_id', user_id).execute()
+                response = _with_retry(service_client.table('user_credits').update({
+                    'credits': new_credits
+                }).eq('user_id', user_id).execute)
                 
-                if response.data and len(response.data) > 0:
-                    logger.info(f"Updated credits for user {user_id} to {new_credits}")
+                if response.data:
+                    logger.info("Updated credits for user %s to %s", user_id, new_credits)
                     return True
                 else:
                     # User doesn't have credits record yet, create one
-                    logger.info(f"User {user_id} doesn't have credits record, creating one with {new_credits} credits")
+                    logger.info("User %s doesn't have credits record, creating one with %s credits", user_id, new_credits)
                     return self.create_user_credits_record(user_id, new_credits) > 0
                     
             return False
             
         except Exception as e:
-            logger.error(f"Error updating credits for user {user_id}: {e}")
+            logger.error("Error updating credits for user %s: %s", user_id, e)
             return False
     
+    def _adjust_credits(self, user_id: str, delta: int) -> Optional[int]:
+        """
+        Atomically changes a user's balance in Postgres (adjust_credits_function.sql)
+        
+        Args:
+            user_id: ID of the user
+            delta: Credits to add (negative to deduct)
+            
+        Returns:
+            New balance, or None if it would drop below zero
+            
+        Raises:
+            APIError: code in _MISSING_FUNCTION_CODES if the function is not installed
+        """
+        response = _with_retry(self.service_client.rpc('adjust_credits', {'p_user_id': user_id, 'p_delta': delta}).execute, idempotent=False)
+        return response.data[0]['credits'] if response.data else None
+    
+    @requires_client(False)
     def deduct_credits(self, user_id: str, amount: int) -> bool:
         """
         Deducts credits from a user's account
@@ -1265,23 +1817,34 @@ class SupabaseManager:
         Returns:
             True if successful, False if insufficient credits or error
         """
-        if not self.is_connected():
-            return False
-        
         try:
-            current_credits = self.get_user_credits(user_id)
+            if not self.service_client:
+                return False
             
-            if current_credits < amount:
-                logger.warning(f"User {user_id} has insufficient credits: {current_credits} < {amount}")
+            try:
+                new_credits = self._adjust_credits(user_id, -amount)
+            except APIError as e:
+                if e.code not in _MISSING_FUNCTION_CODES:
+                    raise
+                logger.warning("adjust_credits RPC not installed, using read-modify-write")
+                current_credits = self.get_user_credits(user_id)
+                if current_credits < amount:
+                    logger.warning("User %s has insufficient credits: %s < %s", user_id, current_credits, amount)
+                    return False
+                return self.update_user_credits(user_id, current_credits - amount)
+            
+            if new_credits is None:
+                logger.warning("User %s has insufficient credits for %s", user_id, amount)
                 return False
             
-            new_credits = current_credits - amount
-            return self.update_user_credits(user_id, new_credits)
+            logger.info("Updated credits for user %s to %s", user_id, new_credits)
+            return True
             
         except Exception as e:
-            logger.error(f"Error deducting credits for user {user_id}: {e}")
+            logger.error("Error deducting credits for user %s: %s", user_id, e)
             return False
     
+    @requires_client(False)
     def add_credits(self, user_id: str, amount: int) -> bool:
         """
         Adds credits to a user's account
@@ -1293,18 +1856,26 @@ class SupabaseManager:
         Returns:
             True if successful, False otherwise
         """
-        if not self.is_connected():
-            return False
-        
         try:
-            current_credits = self.get_user_credits(user_id)
-            new_credits = current_credits + amount
-            return self.update_user_credits(user_id, new_credits)
+            if not self.service_client:
+                return False
+            
+            try:
+                new_credits = self._adjust_credits(user_id, amount)
+            except APIError as e:
+                if e.code not in _MISSING_FUNCTION_CODES:
+                    raise
+                logger.warning("adjust_credits RPC not installed, using read-modify-write")
+                return self.update_user_credits(user_id, self.get_user_credits(user_id) + amount)
+            
+            logger.info("Updated credits for user %s to %s", user_id, new_credits)
+            return new_credits is not None
             
         except Exception as e:
-            logger.error(f"Error adding credits for user {user_id}: {e}")
+            logger.error("Error adding credits for user %s: %s", user_id, e)
             return False
     
+    @requires_client(False)
     def check_processed_payment(self, order_id: str) -> bool:
         """
         Check if a payment has already been processed
@@ -1315,23 +1886,20 @@ class SupabaseManager:
         Returns:
             True if payment has been processed, False otherwise
         """
-        if not self.is_connected():
-            return False
-        
         try:
             # Use service role key to bypass RLS
-            if self.service_role_key:
-                from supabase import create_client
-                service_client = create_client(self.url, self.service_role_key)
+            if self.service_client:
+                service_client = self.service_client
                 
                 response = service_client.table('processed_payments').select('order_id').eq('order_id', order_id).execute()
                 
-                return len(response.data) > 0
+                return bool(response.data)
                 
         except Exception as e:
-            logger.error(f"Error checking processed payment {order_id}: {e}")
+            logger.error("Error checking processed payment %s: %s", order_id, e)
             return False
     
+    @requires_client(False)
     def mark_payment_processed(self, order_id: str, payment_id: str = None, user_id: str = None, 
                              credits_added: int = None, amount_paid: float = None, currency: str = None,
                              payment_type: str = 'nowpayments', stripe_session_id: str = None, 
@@ -1353,14 +1921,10 @@ class SupabaseManager:
         Returns:
             True if successful, False otherwise
         """
-        if not self.is_connected():
-            return False
-        
         try:
             # Use service role key to bypass RLS
-            if self.service_role_key:
-                from supabase import create_client
-                service_client = create_client(self.url, self.service_role_key)
+            if self.service_client:
+                service_client = self.service_client
                 
                 payment_data = {
                     'order_id': order_id,
@@ -1371,8 +1935,7 @@ class SupabaseManager:
                     'currency': currency,
                     'payment_type': payment_type,
                     'stripe_session_id': stripe_session_id,
-                    'customer_email': customer_email,
-                    'processed_at': 'now()'
+                    'customer_email': customer_email
                 }
                 
                 # Remove None values
@@ -1380,16 +1943,17 @@ class SupabaseManager:
                 
                 response = service_client.table('processed_payments').insert(payment_data).execute()
                 
-                if response.data and len(response.data) > 0:
-                    logger.info(f"Marked payment {order_id} as processed for user {user_id}")
+                if response.data:
+                    logger.info("Marked payment %s as processed for user %s", order_id, user_id)
                     return True
                     
         except Exception as e:
-            logger.error(f"Error marking payment as processed {order_id}: {e}")
+            logger.error("Error marking payment as processed %s: %s", order_id, e)
             return False
         
         return False
     
+    @requires_client([])
     def get_user_payment_history(self, user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
         """
         Get payment history for a user
@@ -1401,21 +1965,17 @@ class SupabaseManager:
         Returns:
             List of payment records
         """
-        if not self.is_connected():
-            return []
-        
         try:
             # Use service role key to bypass RLS
-            if self.service_role_key:
-                from supabase import create_client
-                service_client = create_client(self.url, self.service_role_key)
+            if self.service_client:
+                service_client = self.service_client
                 
                 response = service_client.table('processed_payments').select('*').eq('user_id', user_id).order('processed_at', desc=True).limit(limit).execute()
                 
                 return response.data if response.data else []
                 
         except Exception as e:
-            logger.error(f"Error getting payment history for user {user_id}: {e}")
+            logger.error("Error getting payment history for user %s: %s", user_id, e)
             return []
 
     def search_games_with_stats(self, search_query: str, limit: int = None, order_by: str = 'created_at') -> List[Dict[str, Any]]:
@@ -1435,9 +1995,8 @@ class SupabaseManager:
         
         try:
             # Use service role key to bypass RLS
-            if self.service_role_key:
-                from supabase import create_client
-                service_client = create_client(self.url, self.service_role_key)
+            if self.service_client:
+                service_client = self.service_client
                 
                 try:
                     # Search in title field only using ilike for case-insensitive search
@@ -1447,55 +2006,46 @@ class SupabaseManager:
                         # If query is empty after sanitization, return empty results
                         return []
                     
+                    try:
+                        return self._query_games_with_stats_view(service_client, limit, order_by, sanitized_query)
+                    except APIError as e:
+                        if e.code not in _MISSING_RELATION_CODES:
+                            raise
+                        logger.warning("games_with_stats view not installed, using join + client-side sort")
+                    
                     query = service_client.table('user_data').select(
-                        '*, game_statistics(likes_count, plays_count, updated_at)'
-                    ).eq('data_type', 'html_game').ilike('title', f'%{sanitized_query}%')
+                        f'{GAME_LIST_COLUMNS}, game_statistics(likes_count, plays_count, updated_at)'
+                    ).eq('data_type', 'html_game').ilike('title', f'%{escape_like_pattern(sanitized_query)}%')
                     
-                    # Apply ordering
+                    # created_at order and LIMIT run in the DB; stats orderings are sorted and sliced client-side
                     query = query.order('created_at', desc=True)
-                    
-                    # Apply limit if specified
-                    if limit:
+                    sort_by_stats = order_by in ('likes_count', 'plays_count')
+                    if limit and not sort_by_stats:
                         query = query.limit(limit)
                     
                     response = query.execute()
                     
                     if response.data:
-                        # Process the data to flatten statistics
-                        games = []
-                        for game in response.data:
-                            stats = game.get('game_statistics')
-                            if stats and isinstance(stats, dict):
-                                game['likes_count'] = stats.get('likes_count', 0)
-                                game['plays_count'] = stats.get('plays_count', 0)
-                            elif stats and isinstance(stats, list) and len(stats) > 0:
-                                stat = stats[0]
-                                game['likes_count'] = stat.get('likes_count', 0)
-                                game['plays_count'] = stat.get('plays_count', 0)
-                            else:
-                                game['likes_count'] = 0
-                                game['plays_count'] = 0
-                            games.append(game)
+                        games = self._flatten_stats_rows(response.data)
                         
-                        # Client-side sorting for statistics
-                        if order_by == 'likes_count':
-                            games.sort(key=lambda x: x.get('likes_count', 0), reverse=True)
-                        elif order_by == 'plays_count':
-                            games.sort(key=lambda x: x.get('plays_count', 0), reverse=True)
+                        if sort_by_stats:
+                            games.sort(key=itemgetter(order_by), reverse=True)
+                            if limit:
+                                games = games[:limit]
                         
                         return games
                     
                     return []
                     
                 except Exception as e:
-                    logger.error(f"Error searching games with stats: {e}")
+                    logger.error("Error searching games with stats: %s", e)
                     # Fallback to basic search
                     return self._search_games_fallback(service_client, search_query, limit, order_by)
             else:
                 return self._search_games_fallback(self.client, search_query, limit, order_by)
                 
         except Exception as e:
-            logger.error(f"Error in search_games_with_stats: {e}")
+            logger.error("Error in search_games_with_stats: %s", e)
             return []
     
     def _search_games_fallback(self, client, search_query: str, limit: int = None, order_by: str = 'created_at') -> List[Dict[str, Any]]:
@@ -1510,7 +2060,7 @@ class SupabaseManager:
                 # If query is empty after sanitization, return empty results
                 return []
             
-            query = client.table('user_data').select('*').eq('data_type', 'html_game').ilike('title', f'%{sanitized_query}%')
+            query = client.table('user_data').select(GAME_LIST_COLUMNS).eq('data_type', 'html_game').ilike('title', f'%{escape_like_pattern(sanitized_query)}%')
             
             # Simple ordering
             query = query.order('created_at', desc=True)
@@ -1534,7 +2084,7 @@ class SupabaseManager:
             return []
             
         except Exception as e:
-            logger.error(f"Fallback search method failed: {e}")
+            logger.error("Fallback search method failed: %s", e)
             return []
     
     def search_user_games(self, user_id: str, search_query: str) -> List[Dict[str, Any]]:
@@ -1559,20 +2109,20 @@ class SupabaseManager:
                 return []
             
             # Use service role key for server-side operations to bypass RLS
-            if self.service_role_key:
-                from supabase import create_client
-                service_client = create_client(self.url, self.service_role_key)
-                response = service_client.table('user_data').select('*').eq('user_id', user_id).eq('data_type', 'html_game').ilike('title', f'%{sanitized_query}%').order('created_at', desc=True).execute()
+            if self.service_client:
+                service_client = self.service_client
+                response = service_client.table('user_data').select(GAME_LIST_COLUMNS).eq('user_id', user_id).eq('data_type', 'html_game').ilike('title', f'%{escape_like_pattern(sanitized_query)}%').order('created_at', desc=True).execute()
             else:
-                response = self.client.table('user_data').select('*').eq('user_id', user_id).eq('data_type', 'html_game').ilike('title', f'%{sanitized_query}%').order('created_at', desc=True).execute()
+                response = self.client.table('user_data').select(GAME_LIST_COLUMNS).eq('user_id', user_id).eq('data_type', 'html_game').ilike('title', f'%{escape_like_pattern(sanitized_query)}%').order('created_at', desc=True).execute()
             
             return response.data if response.data else []
         except Exception as e:
-            logger.error(f"Error searching user games: {e}")
+            logger.error("Error searching user games: %s", e)
             return []
 
     # ============ NICKNAMES SYSTEM METHODS ============
     
+    @requires_client(None)
     def get_user_nickname(self, user_id: str) -> Optional[str]:
         """
         Gets the nickname for a user
@@ -1583,26 +2133,76 @@ class SupabaseManager:
         Returns:
             User's nickname or None if not found
         """
-        if not self.is_connected():
-            return None
+        with self._cache_lock:
+            cached = self._nickname_cache.get(str(user_id), _NOT_CACHED)
+        if cached is not _NOT_CACHED:
+            return cached
         
         try:
             # Use service role key to bypass RLS
-            if self.service_role_key:
-                from supabase import create_client
-                service_client = create_client(self.url, self.service_role_key)
+            if self.service_client:
+                service_client = self.service_client
                 response = service_client.table('user_nicknames').select('nickname').eq('user_id', user_id).execute()
             else:
                 response = self.client.table('user_nicknames').select('nickname').eq('user_id', user_id).execute()
             
-            if response.data and len(response.data) > 0:
-                return response.data[0]['nickname']
-            return None
+            nickname = None
+            if response.data:
+                nickname = response.data[0]['nickname']
+            with self._cache_lock:
+                self._nickname_cache[str(user_id)] = nickname
+            return nickname
             
         except Exception as e:
-            logger.error(f"Error getting nickname for user {user_id}: {e}")
+            logger.error("Error getting nickname for user %s: %s", user_id, e)
             return None
     
+    @requires_client({})
+    def get_many_nicknames(self, user_ids: List[str]) -> Dict[str, Optional[str]]:
+        """
+        Gets nicknames for several users, querying only the ones not cached yet (one request)
+        
+        Args:
+            user_ids: IDs of the users
+            
+        Returns:
+            Dictionary mapping each user_id to its nickname (None if the user has none)
+        """
+        nicknames = {}
+        missing = []
+        with self._cache_lock:
+            for user_id in {str(user_id) for user_id in user_ids if user_id}:
+                cached = self._nickname_cache.get(user_id, _NOT_CACHED)
+                if cached is _NOT_CACHED:
+                    missing.append(user_id)
+                else:
+                    nicknames[user_id] = cached
+        
+        if not missing:
+            return nicknames
+        
+        try:
+            client = self.service_client or self.client
+            fetched = dict.fromkeys(missing)
+            # Batches keep the in.(...) filter well under URL length limits on the all-games page
+            for start in range(0, len(missing), _IN_FILTER_BATCH):
+                response = client.table('user_nicknames').select('user_id, nickname').in_('user_id', missing[start:start + _IN_FILTER_BATCH]).execute()
+                fetched.update((str(item['user_id']), item['nickname']) for item in response.data or [])
+            with self._cache_lock:
+                self._nickname_cache.update(fetched)
+            nicknames.update(fetched)
+            
+        except Exception as e:
+            logger.error("Error getting nicknames for %s users: %s", len(missing), e)
+        
+        return nicknames
+    
+    def _invalidate_nickname(self, user_id: str) -> None:
+        """Drops the cached nickname after set_user_nickname / delete_user_nickname"""
+        with self._cache_lock:
+            self._nickname_cache.pop(str(user_id), None)
+            self._all_nicknames_cache.clear()
+    
     def set_user_nickname(self, user_id: str, nickname: str) -> bool:
         """
         Sets or updates the nickname for a user
@@ -1620,39 +2220,41 @@ class SupabaseManager:
         # Validate nickname length and characters
         nickname = nickname.strip()
         if len(nickname) < 2 or len(nickname) > 50:
-            logger.error(f"Nickname must be between 2 and 50 characters: {nickname}")
+            logger.error("Nickname must be between 2 and 50 characters: %s", nickname)
             return False
         
         # Check for valid characters (alphanumeric, spaces, hyphens, underscores)
-        import re
-        if not re.match(r'^[a-zA-Z0-9\s\-_]+$', nickname):
-            logger.error(f"Nickname contains invalid characters: {nickname}")
+        if not _NICKNAME_RE.fullmatch(nickname):
+            logger.error("Nickname contains invalid characters: %s", nickname)
             return False
         
         try:
             # Use service role key to bypass RLS
-            if self.service_role_key:
-                from supabase import create_client
-                service_client = create_client(self.url, self.service_role_key)
+            if self.service_client:
+                service_client = self.service_client
                 
-                # Try to update existing nickname first
-                update_response = service_client.table('user_nicknames').update({
-                    'nickname': nickname,
-                    'updated_at': 'now()'
-                }).eq('user_id', user_id).execute()
-                
-                if update_response.data and len(update_response.data) > 0:
-                    logger.info(f"Updated nickname for user {user_id} to '{nickname}'")
-                    return True
-                
-                # If no existing record, insert new one
-                insert_response = service_client.table('user_nicknames').insert({
-                    'user_id': user_id,
-                    'nickname': nickname
-                }).execute()
+                # Insert or update in one round-trip (user_nicknames_upsert_index.sql)
+                try:
+                    response = service_client.table('user_nicknames').upsert({
+                        'user_id': user_id,
+                        'nickname': nickname
+                    }, on_conflict='user_id').execute()
+                except APIError as e:
+                    if e.code != _NO_CONFLICT_TARGET_CODE:
+                        raise
+                    logger.warning("user_nicknames has no unique index on user_id, using update + insert")
+                    response = service_client.table('user_nicknames').update({
+                        'nickname': nickname
+                    }).eq('user_id', user_id).execute()
+                    if not response.data:
+                        response = service_client.table('user_nicknames').insert({
+                            'user_id': user_id,
+                            'nickname': nickname
+                        }).execute()
                 
-                if insert_response.data and len(insert_response.data) > 0:
-                    logger.info(f"Set nickname for user {user_id} to '{nickname}'")
+                if response.data:
+                    self._invalidate_nickname(user_id)
+                    logger.info("Set nickname for user %s to '%s'", user_id, nickname)
                     return True
                     
             return False
@@ -1660,12 +2262,13 @@ class SupabaseManager:
         except Exception as e:
             # Handle duplicate nickname error
             if 'unique constraint' in str(e).lower() or 'duplicate key' in str(e).lower():
-                logger.error(f"Nickname '{nickname}' is already taken")
+                logger.error("Nickname '%s' is already taken", nickname)
                 return False
             
-            logger.error(f"Error setting nickname for user {user_id}: {e}")
+            logger.error("Error setting nickname for user %s: %s", user_id, e)
             return False
     
+    @requires_client(False)
     def delete_user_nickname(self, user_id: str) -> bool:
         """
         Deletes the nickname for a user
@@ -1676,23 +2279,20 @@ class SupabaseManager:
         Returns:
             True if successful, False otherwise
         """
-        if not self.is_connected():
-            return False
-        
         try:
             # Use service role key to bypass RLS
-            if self.service_role_key:
-                from supabase import create_client
-                service_client = create_client(self.url, self.service_role_key)
+            if self.service_client:
+                service_client = self.service_client
                 response = service_client.table('user_nicknames').delete().eq('user_id', user_id).execute()
+                self._invalidate_nickname(user_id)
                 
-                logger.info(f"Deleted nickname for user {user_id}")
+                logger.info("Deleted nickname for user %s", user_id)
                 return True
                     
             return False
             
         except Exception as e:
-            logger.error(f"Error deleting nickname for user {user_id}: {e}")
+            logger.error("Error deleting nickname for user %s: %s", user_id, e)
             return False
     
     def get_nickname_by_user_id(self, user_id: str) -> Optional[str]:
@@ -1707,6 +2307,7 @@ class SupabaseManager:
         """
         return self.get_user_nickname(user_id)
     
+    @requires_client({})
     def get_all_nicknames(self) -> Dict[str, str]:
         """
         Gets all user nicknames as a mapping of user_id to nickname
@@ -1714,26 +2315,31 @@ class SupabaseManager:
         Returns:
             Dictionary mapping user_id to nickname
         """
-        if not self.is_connected():
-            return {}
+        with self._cache_lock:
+            cached = self._all_nicknames_cache.get('all')
+        if cached is not None:
+            return dict(cached)
         
         try:
             # Use service role key to bypass RLS
-            if self.service_role_key:
-                from supabase import create_client
-                service_client = create_client(self.url, self.service_role_key)
+            if self.service_client:
+                service_client = self.service_client
                 response = service_client.table('user_nicknames').select('user_id, nickname').execute()
             else:
                 response = self.client.table('user_nicknames').select('user_id, nickname').execute()
             
-            if response.data:
-                return {item['user_id']: item['nickname'] for item in response.data}
-            return {}
+            nicknames = {item['user_id']: item['nickname'] for item in response.data or []}
+            with self._cache_lock:
+                self._all_nicknames_cache['all'] = nicknames
+                # Prime the per-user cache too (only users that have a nickname appear here)
+                self._nickname_cache.update((str(user_id), nickname) for user_id, nickname in nicknames.items())
+            return dict(nicknames)
             
         except Exception as e:
-            logger.error(f"Error getting all nicknames: {e}")
+            logger.error("Error getting all nicknames: %s", e)
             return {}
     
+    @requires_client([])
     def get_games_with_nicknames(self, limit: int = None, order_by: str = 'created_at') -> List[Dict[str, Any]]:
         """
         Gets all uploaded HTML games with user nicknames (if available)
@@ -1746,57 +2352,78 @@ class SupabaseManager:
         Returns:
             List of dictionaries with game data and user nicknames
         """
-        if not self.is_connected():
-            return []
-        
         try:
             # For trending games (likes_count ordering), always try to get actual likes data first
             if order_by == 'likes_count':
                 logger.info("Getting games with actual likes data for trending")
                 games = self._get_games_with_actual_likes(limit)
             else:
+                if self.service_client:
+                    # Games, statistics and nicknames in one query
+                    try:
+                        return self._query_games_with_stats_view(self.service_client, limit, order_by, with_nickname=True)
+                    except APIError as e:
+                        if e.code not in _MISSING_RELATION_CODES and e.code != _UNDEFINED_COLUMN_CODE:
+                            raise
+                        logger.warning("games_with_stats view without user_nickname, fetching nicknames separately")
+                
                 # For other orderings, use the stats method
                 games = self.get_games_with_stats(limit, order_by)
             
             if not games:
                 return []
             
-            # Now try to get nicknames for all users and add them to the games
-            try:
-                # Get all nicknames
-                if self.service_role_key:
-                    from supabase import create_client
-                    service_client = create_client(self.url, self.service_role_key)
-                    nicknames_response = service_client.table('user_nicknames').select('user_id, nickname').execute()
-                    
-                    if nicknames_response.data:
-                        # Create a mapping of user_id to nickname
-                        nicknames_map = {item['user_id']: item['nickname'] for item in nicknames_response.data}
-                        
-                        # Add nicknames to games
-                        for game in games:
-                            user_id = game.get('user_id')
-                            if user_id in nicknames_map:
-                                game['user_nickname'] = nicknames_map[user_id]
-                            else:
-                                game['user_nickname'] = None
-                    else:
-                        # No nicknames found, set all to None
-                        for game in games:
-                            game['user_nickname'] = None
-                            
-            except Exception as e:
-                logger.warning(f"Could not fetch nicknames, games will show user IDs: {e}")
-                # Set all nicknames to None if we can't fetch them
-                for game in games:
-                    game['user_nickname'] = None
+            # Add nicknames for the authors on this page (cached; one query for the uncached ones)
+            nicknames_map = self.get_many_nicknames([game.get('user_id') for game in games])
+            for game in games:
+                game['user_nickname'] = nicknames_map.get(str(game.get('user_id')))
+            
+            return games
+            
+        except Exception as e:
+            logger.error("Error getting games with nicknames: %s", e)
+            return []
+    
+    @requires_client([])
+    def list_games_for_user(self, user_id: str, limit: int = None, order_by: str = 'created_at') -> List[Dict[str, Any]]:
+        """
+        Gets games with statistics, user nicknames and a per-game `liked` flag
+        for a logged-in user in one round-trip (list_games_for_user_function.sql)
+        Falls back to get_games_with_nicknames + get_liked_game_ids_in if the function is not installed
+        
+        Args:
+            user_id: ID of the user viewing the list
+            limit: Maximum number of games to return
+            order_by: Field to order by ('created_at', 'likes_count', 'plays_count')
             
+        Returns:
+            List of dictionaries with game data, statistics, user_nickname and liked
+        """
+        try:
+            if self.service_client:
+                try:
+                    response = self.service_client.rpc('list_games_for_user', {
+                        'p_user_id': user_id,
+                        'p_order_by': order_by if order_by in _GAME_SORT_FIELDS else 'created_at',
+                        'p_limit': limit
+                    }).execute()
+                    return response.data or []
+                except APIError as e:
+                    if e.code not in _MISSING_FUNCTION_CODES and e.code not in _MISSING_RELATION_CODES:
+                        raise
+                    logger.warning("list_games_for_user RPC not installed, using separate games and likes queries")
+            
+            games = self.get_games_with_nicknames(limit, order_by)
+            liked_ids = self.get_liked_game_ids_in(user_id, [game['id'] for game in games])
+            for game in games:
+                game['liked'] = game['id'] in liked_ids
             return games
             
         except Exception as e:
-            logger.error(f"Error getting games with nicknames: {e}")
+            logger.error("Error listing games for user %s: %s", user_id, e)
             return []
     
+    @requires_client([])
     def _get_games_with_actual_likes(self, limit: int = None) -> List[Dict[str, Any]]:
         """
         Gets games with actual likes count from game_likes table
@@ -1808,49 +2435,55 @@ class SupabaseManager:
         Returns:
             List of dictionaries with game data and actual likes count
         """
-        if not self.is_connected():
-            return []
-        
         try:
             # Use service role key to bypass RLS
-            if self.service_role_key:
-                from supabase import create_client
-                service_client = create_client(self.url, self.service_role_key)
+            if self.service_client:
+                service_client = self.service_client
                 
-                # Get all games first
-                games_response = service_client.table('user_data').select('*').eq('data_type', 'html_game').execute()
+                try:
+                    # Likes counted, sorted and limited in Postgres (trending_games_view.sql)
+                    query = service_client.table('trending_games').select(f'{GAME_LIST_COLUMNS},likes_count,plays_count')
+                    query = query.order('likes_count', desc=True).order('created_at', desc=True)
+                    if limit:
+                        query = query.limit(limit)
+                    return query.execute().data or []
+                except APIError as e:
+                    if e.code not in _MISSING_RELATION_CODES:
+                        raise
+                    logger.warning("trending_games view not installed, counting likes client-side")
+                
+                # The likes and plays reads don't depend on the games list: run them alongside it
+                likes_future = self.submit(service_client.table('game_likes').select('game_id').execute)
+                plays_future = self.submit(service_client.table('game_statistics').select('game_id, plays_count').execute)
+                
+                games_response = service_client.table('user_data').select(GAME_LIST_COLUMNS).eq('data_type', 'html_game').execute()
                 
                 if not games_response.data:
                     logger.info("No games found in database")
                     return []
                 
-                logger.info(f"Found {len(games_response.data)} games, counting likes...")
+                logger.info("Found %s games, counting likes...", len(games_response.data))
                 
-                # Get likes count for each game
-                games = []
-                for game in games_response.data:
+                # One query per table instead of two per game: tally likes and map plays client-side
+                try:
+                    likes_response = likes_future.result()
+                    likes_counts = Counter(row['game_id'] for row in likes_response.data or [])
+                except Exception as e:
+                    logger.warning("Error counting likes, using 0: %s", e)
+                    likes_counts = {}
+                
+                try:
+                    plays_response = plays_future.result()
+                    plays_counts = {row['game_id']: row['plays_count'] or 0 for row in plays_response.data or []}
+                except Exception as e:
+                    logger.warning("Error loading play counts, using 0: %s", e)
+                    plays_counts = {}
+                
+                games = games_response.data
+                for game in games:
                     game_id = game.get('id')
-                    
-                    try:
-                        # Count likes for this game
-                        likes_response = service_client.table('game_likes').select('id', count='exact').eq('game_id', game_id).execute()
-                        likes_count = likes_response.count if likes_response.count is not None else 0
-                        
-                        plays_response = service_client.table('game_statistics').select('plays_count').eq('game_id', game_id).execute()
-                        plays_count = plays_response.data[0]['plays_count'] if plays_response.data and len(plays_response.data) > 0 else 0
-                        
-                        game['likes_count'] = likes_count
-                        game['plays_count'] = plays_count
-                        games.append(game)
-                        
-                        # Log removed to reduce noise
-                            
-                    except Exception as e:
-                        logger.warning(f"Error counting likes for game {game_id}: {e}")
-                        # Still add the game with 0 likes
-                        game['likes_count'] = 0
-                        game['plays_count'] = 0
-                        games.append(game)
+                    game['likes_count'] = likes_counts.get(game_id, 0)
+                    game['plays_count'] = plays_counts.get(game_id, 0)
                 
                 # Sort by likes count (descending)
                 games.sort(key=lambda x: x.get('likes_count', 0), reverse=True)
@@ -1859,15 +2492,15 @@ class SupabaseManager:
                 if limit:
                     games = games[:limit]
                 
-                logger.info(f"Retrieved {len(games)} games with actual likes data")
+                logger.info("Retrieved %s games with actual likes data", len(games))
                 if games:
-                    logger.info(f"Top game has {games[0].get('likes_count', 0)} likes")
+                    logger.info("Top game has %s likes", games[0].get('likes_count', 0))
                 return games
                 
             return []
             
         except Exception as e:
-            logger.error(f"Error getting games with actual likes: {e}")
+            logger.error("Error getting games with actual likes: %s", e)
             return []
     
     def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
@@ -1886,30 +2519,48 @@ class SupabaseManager:
         
         try:
             # Query auth.users table using service role key
-            if not self.service_role_key:
+            if not self.service_client:
                 logger.error("Service role key not configured")
                 return None
             
-            # Create a client with service role key for admin operations
-            admin_client = create_client(self.url, self.service_role_key)
+            # Shared service role client for admin operations
+            admin_client = self.service_client
             
-            # Get user from auth.users
-            result = admin_client.auth.admin.list_users()
-            
-            for user in result:
-                if user.email == email:
-                    return {
-                        'id': user.id,
-                        'email': user.email,
-                        'created_at': user.created_at
-                    }
+            try:
+                # Single indexed lookup in auth.users (get_user_by_email_function.sql)
+                response = admin_client.rpc('get_user_by_email', {'p_email': email}).execute()
+                if response.data:
+                    return dict(response.data[0])
+                logger.warning("User with email %s not found", email)
+                return None
+            except APIError as e:
+                if e.code not in _MISSING_FUNCTION_CODES:
+                    raise
+                logger.warning("get_user_by_email RPC not installed, paging through auth users")
+            
+            # Get user from auth.users, one admin page at a time until it is found
+            page = 1
+            while True:
+                result = admin_client.auth.admin.list_users(page=page, per_page=_AUTH_USERS_PAGE_SIZE)
+                
+                for user in result:
+                    if user.email == email:
+                        return {
+                            'id': user.id,
+                            'email': user.email,
+                            'created_at': user.created_at
+                        }
+                
+                if len(result) < _AUTH_USERS_PAGE_SIZE:
+                    break
+                page += 1
             
-            logger.warning(f"User with email {email} not found")
+            logger.warning("User with email %s not found", email)
             return None
             
         except Exception as e:
-            logger.error(f"Error getting user by email {email}: {e}")
+            logger.error("Error getting user by email %s: %s", email, e)
             return None
 
 # Глобальный экземпляр менеджера Supabase
-supabase_manager = SupabaseManager()
+supabase_manager = SupabaseManager.get_instance()
@@ -0,0 +1,27 @@
+-- Games ranked by their actual game_likes rows, so ORDER BY likes_count and LIMIT run in Postgres
+-- Used by SupabaseManager._get_games_with_actual_likes (trending list on the home and games pages)
+CREATE OR REPLACE VIEW trending_games
+WITH (security_invoker = true) AS
+SELECT
+    ud.id,
+    ud.user_id,
+    ud.data_type,
+    ud.filename,
+    ud.title,
+    ud.description,
+    ud.thumbnail_url,
+    ud.created_at,
+    ud.updated_at,
+    COALESCE(gl.likes_count, 0) AS likes_count,
+    COALESCE(gs.plays_count, 0) AS plays_count
+FROM user_data ud
+LEFT JOIN (
+    SELECT game_id, COUNT(*)::INTEGER AS likes_count
+    FROM game_likes
+    GROUP BY game_id
+) gl ON gl.game_id = ud.id
+LEFT JOIN game_statistics gs ON gs.game_id = ud.id
+WHERE ud.data_type = 'html_game';
+
+-- Per-game likes aggregation
+CREATE INDEX IF NOT EXISTS idx_game_likes_game_id ON game_likes(game_id);
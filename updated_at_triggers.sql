@@ -0,0 +1,25 @@
+-- Server-side updated_at for the tables SupabaseManager updates in place,
+-- so update payloads no longer carry the literal string 'now()'
+-- Requires user_data_timestamps.sql (defines set_updated_at())
+
+ALTER TABLE user_credits ALTER COLUMN updated_at SET DEFAULT NOW();
+ALTER TABLE game_statistics ALTER COLUMN updated_at SET DEFAULT NOW();
+ALTER TABLE user_nicknames ALTER COLUMN updated_at SET DEFAULT NOW();
+
+DROP TRIGGER IF EXISTS trg_user_credits_updated_at ON user_credits;
+CREATE TRIGGER trg_user_credits_updated_at
+    BEFORE UPDATE ON user_credits
+    FOR EACH ROW
+    EXECUTE FUNCTION set_updated_at();
+
+DROP TRIGGER IF EXISTS trg_game_statistics_updated_at ON game_statistics;
+CREATE TRIGGER trg_game_statistics_updated_at
+    BEFORE UPDATE ON game_statistics
+    FOR EACH ROW
+    EXECUTE FUNCTION set_updated_at();
+
+DROP TRIGGER IF EXISTS trg_user_nicknames_updated_at ON user_nicknames;
+CREATE TRIGGER trg_user_nicknames_updated_at
+    BEFORE UPDATE ON user_nicknames
+    FOR EACH ROW
+    EXECUTE FUNCTION set_updated_at();
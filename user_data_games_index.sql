@@ -0,0 +1,6 @@
+-- Keyset pagination for SupabaseManager.get_all_uploaded_games
+-- (WHERE data_type = 'html_game' AND (created_at, id) < cursor ORDER BY created_at DESC, id DESC LIMIT n)
+DROP INDEX IF EXISTS idx_user_data_games_created_at;
+CREATE INDEX IF NOT EXISTS idx_user_data_games_created_at_id
+    ON user_data(created_at DESC, id DESC)
+    WHERE data_type = 'html_game';
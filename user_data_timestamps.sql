@@ -0,0 +1,19 @@
+-- Server-side timestamps for user_data so clients never send "now()" strings
+ALTER TABLE user_data
+    ALTER COLUMN created_at SET DEFAULT NOW(),
+    ALTER COLUMN updated_at SET DEFAULT NOW();
+
+-- Keep updated_at current on every UPDATE
+CREATE OR REPLACE FUNCTION set_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_user_data_updated_at ON user_data;
+CREATE TRIGGER trg_user_data_updated_at
+    BEFORE UPDATE ON user_data
+    FOR EACH ROW
+    EXECUTE FUNCTION set_updated_at();
@@ -0,0 +1,6 @@
+-- Trigram index so ILIKE '%query%' title searches on games use an index instead of a sequential scan
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_user_data_games_title_trgm
+    ON user_data USING gin (title gin_trgm_ops)
+    WHERE data_type = 'html_game';
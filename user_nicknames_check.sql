@@ -0,0 +1,9 @@
+-- Same nickname rules as SupabaseManager.set_user_nickname, enforced for every writer
+-- NOT VALID: existing rows are not re-checked, new inserts/updates are
+ALTER TABLE user_nicknames DROP CONSTRAINT IF EXISTS user_nicknames_nickname_check;
+ALTER TABLE user_nicknames
+    ADD CONSTRAINT user_nicknames_nickname_check
+    CHECK (
+        char_length(nickname) BETWEEN 2 AND 50
+        AND nickname ~ '^[A-Za-z0-9[:space:]_-]+$'
+    ) NOT VALID;
@@ -0,0 +1,4 @@
+-- Conflict target for SupabaseManager.set_user_nickname (INSERT ... ON CONFLICT (user_id) in one round-trip)
+-- Resolve existing duplicate user_id rows before running this.
+CREATE UNIQUE INDEX IF NOT EXISTS idx_user_nicknames_user_id
+    ON user_nicknames(user_id);